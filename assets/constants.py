@@ -20,9 +20,29 @@ TIMEZONE = timezone(timedelta(hours=2), "France")  # Your time zone here
 # Game constants
 
 DIALOGS_PATH = "data/story.json"
+DIALOGS_SCHEMA_PATH = "data/editable.json"
+DIALOGS_WATCH_INTERVAL = 5  # Seconds between two checks for changes of DIALOGS_PATH
 EVENTS_PATH = "data/events.xml"
-XP_COUNTS_PATH = "data/xp_counts.xml"
+XP_COUNTS_PATH = "data/xp_counts.bin"
+LEGACY_XP_COUNTS_PATH = "data/xp_counts.xml"  # Imported into XP_COUNTS_PATH if this one doesn't exist yet
+JOURNAL_PATH = "data/journal.jsonl"
+DATABASE_PATH = "data/werewolf.db"
+REPLAYS_PATH = "data/replays"  # Directory where the replay logs of the games are written, None to disable them
+FLUSH_DELAY = 5  # Seconds during which the changes made to the events and the xp accounts are gathered before saving
+STORAGE_BACKEND = "xml"  # "xml" (EVENTS_PATH, XP_COUNTS_PATH and JOURNAL_PATH) or "sqlite" (DATABASE_PATH)
+JOURNAL_MAX_SIZE = 256 * 1024  # Size in bytes from which the journal is compacted into the events and xp files
+EVENT_DURATION = 60  # Minutes an event is expected to last, to tell which events overlap
+MAX_RECURRENCE = 365  # Maximum number of days between two occurrences of a recurring event
+LISTED_EVENTS = 15  # Number of occurrences of events shown by $calendar list (a recurring event can appear often)
 MINIMUM_PLAYERS = 1
+STEP_TRANSITION_DELAY = 1  # Seconds waited between two steps of a game, unless the step defines its own delay
+SESSION_INBOX_SIZE = 50  # Maximum number of messages waiting to be processed by a game
+MAX_CONCURRENT_SENDS = 10  # Maximum number of messages sent at the same time when broadcasting
+UNREACHABLE_USER_TTL = 3600  # Seconds during which a user that couldn't be fetched isn't fetched again
+DM_RATE = 5  # Direct messages per second the bot sends at most when notifying the events members
+DM_BURST = 10  # Direct messages that can be sent at once before DM_RATE applies
+SEND_RETRIES = 3  # Number of times a message is sent again after a rate limit or a server error
+SEND_RETRY_DELAY = 1  # Seconds waited on average before the first retry, doubled after each retry
 WHITE_VOTE = "Vote blanc"
 ALLTIMES_CMDS = (
     'admin',
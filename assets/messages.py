@@ -1,18 +1,64 @@
+import re
+import string
+
 import discord
 from discord import Embed
 
 import assets.constants as consts
 
+
+_FORMATTER = string.Formatter()
+# The space flag is left out, so that a literal percent sign followed by a word ("50% de") isn't taken for a conversion
+_CONVERSION = re.compile(r"%(?:\([^)]*\))?[-#0+]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?[diouxXeEfFgGcrsa%]")
+
+
+def _placeholders(template):
+    """Returns the names of the fields of the format string TEMPLATE. Raises a ValueError if it is invalid."""
+    return {
+        field.split('.')[0].split('[')[0]
+        for _, field, _, _ in _FORMATTER.parse(template) if field is not None
+    }
+
+
 class _EmbedSkeleton:
     """
     Represents an incomplete discord Embed. This allows you to record a template into it and
     to format this template to get a ready Embed using self.build()
+    The templates are checked once and for all when the skeleton is created, and a skeleton without placeholders
+    builds its Embed only once : self.build() then always returns the same, frozen Embed, that mustn't be modified.
+    self.renders counts how many times the skeleton was built or formatted.
     """
     def __init__(self, *, title, content, footer=None, color=None):
         self.title = title
         self.content = content
-        self.footer = footer
+        self.footer = footer or None
         self.color = color
+        self.renders = 0
+
+        self.placeholders = frozenset().union(
+            *(_placeholders(template) for template in (title, content, self.footer) if template)
+        )
+        try:
+            self._color = getattr(discord.Color, color)() if color else Embed.Empty
+        except AttributeError:
+            raise ValueError("Unknown color %s" % color) from None
+        self._frozen = None if self.placeholders else self._build()
+
+    def _build(self, **info):
+        embed = Embed(
+            title=self.title.format(**info),
+            description=self.content.format(**info),
+            color=self._color
+        )
+        if self.footer:
+            embed.set_footer(text=self.footer.format(**info))
+        return embed
+
+    def _check(self, info):
+        missing = self.placeholders.difference(info)
+        if missing:
+            raise KeyError("Missing info %s to build the embed '%s'" % (", ".join(sorted(missing)), self.title))
+        self.renders += 1
 
     def build(self, **info):
         """
@@ -27,17 +73,12 @@ class _EmbedSkeleton:
 
         The corresponding discord Embed
         """
-        embed = Embed(
-            title=self.title.format(**info),
-            description=self.content.format(**info),
-            color=getattr(discord.Color, self.color)() if self.color else Embed.Empty
-        )
-        if self.footer:
-            embed.set_footer(text=self.footer.format(**info))
-        return embed
+        self._check(info)
+        return self._frozen or self._build(**info)
 
     def as_str(self, **info):
         """Same as build, by returns a string instead of an Embed"""
+        self._check(info)
         template = """%s
         
         %s
@@ -46,11 +87,38 @@ class _EmbedSkeleton:
 
         header = self.title.format(**info)
         content = self.content.format(**info)
-        footer = self.footer.format(**info)
+        footer = self.footer.format(**info) if self.footer else ""
 
         return template % (header, content, footer)
 
 
+class _Message(str):
+    """
+    A %-style message of this module. Its conversions are checked once and for all when the module is imported, and
+    self.renders counts how many times it was formatted with the % operator. The messages that have no conversion are
+    sent as they are, without being formatted : they're never counted, and may contain literal percent signs.
+    """
+    def __new__(cls, text, name):
+        self = str.__new__(cls, text)
+        if _CONVERSION.search(text) and "%" in _CONVERSION.sub("", text):
+            raise ValueError("Invalid conversion or unescaped percent sign in the message %s" % name)
+        self.renders = 0
+        return self
+
+    def __mod__(self, args):
+        self.renders += 1
+        return str.__mod__(self, args)
+
+
+def render_counts():
+    """
+    Returns the name -> number of renders of all the embeds and the %-style messages of this module, from the most to
+    the least rendered
+    """
+    counts = {name: value.renders for name, value in globals().items() if isinstance(value, (_EmbedSkeleton, _Message))}
+    return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+
 # --- Global ---
 
 MISSING_PARAMETER = """
@@ -267,6 +335,21 @@ NO_OPENED_EVENT = _EmbedSkeleton(
 )
 
 
+# --- calendar day ---
+
+DAY_EVENTS_LIST = _EmbedSkeleton(
+    title="Les événements du {date} :",
+    content="- {events}",
+    footer="Utilisez $calendar subscribe UnÉvénement pour en rejoindre un"
+)
+
+NO_EVENT_THAT_DAY = _EmbedSkeleton(
+    title="Journée calme...",
+    content="Il n'y a aucun événement de prévu le {date}.",
+    footer="Et si tu en ajoutais un ?"
+)
+
+
 # --- calendar me ---
 
 GET_JOINED_EVENTS = _EmbedSkeleton(
@@ -427,6 +510,10 @@ Le message que vous avez envoyé (%s) a provoqué une erreur lors de son envoi a
 rapidement relayé aux développeurs afin de le résoudre.
 """
 
+INBOX_FULL = """
+La partie %s reçoit trop de messages à la fois, le vôtre (%s) a été ignoré. Réessayez dans quelques instants !
+"""
+
 
 # LEVEL
 
@@ -447,6 +534,10 @@ GET_RANKS = _EmbedSkeleton(
 
 # EVENTS
 
+NOTIFICATION_REPORT = """
+:envelope: Le message "%s" n'a pas pu être envoyé à %i des %i membres de votre événement : %s
+"""
+
 GAME_CREATED_BY_EVENT = """
 La partie %s vient d'être automatiquement créé par l'événement du même nom ! Tape simplement "$calendar present %s" pour
 confirmer ta présence et la rejoindre au passage ! 
@@ -533,3 +624,8 @@ Dans tous les cas, bon jeu, en espérant que vous ayez compris !
     color="blue"
 )
 
+
+# Checks all the %-style messages above, and counts their renders (see _Message)
+for _name, _value in list(globals().items()):
+    if _name.isupper() and type(_value) is str:
+        globals()[_name] = _Message(_value, _name)
@@ -1,7 +1,11 @@
 import discord
+import asyncio
 import enum
+import random
+import time
 import assets.messages as msgs
 import assets.logger as logger
+from assets.constants import MAX_CONCURRENT_SENDS, SEND_RETRY_DELAY
 
 
 class _DiscordFormatter:
@@ -190,6 +194,96 @@ def make_mention(u_id: int):
     return "<@"+str(u_id)+">"
 
 
+class DeliveryReport:
+    """Sums up a broadcast : how many seconds each delivery took, and which ones failed (with their exception)"""
+    def __init__(self):
+        self.timings = {}
+        self.failures = {}
+
+    def __repr__(self):
+        return "<DeliveryReport : %i delivered, %i failed>" % (len(self.delivered), len(self.failures))
+
+    @property
+    def delivered(self):
+        """Returns the recipients that received the message"""
+        return [recipient for recipient in self.timings if recipient not in self.failures]
+
+
+class TokenBucket:
+    """
+    Allows RATE operations per second on average, and bursts of at most CAPACITY operations. Share one bucket between
+    all the senders that must stay under the same rate limit.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        _now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (_now - self._updated) * self.rate)
+        self._updated = _now
+
+    async def acquire(self):
+        """Waits until a token is available, and takes it"""
+        async with self._lock:  # The waiters are served in order
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+def _is_transient(error):
+    """Returns True if sending a message failed because of ERROR, but could succeed if tried again"""
+    if isinstance(error, discord.HTTPException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+async def broadcast(recipients, content=None, *, concurrency=MAX_CONCURRENT_SENDS, bucket=None, retries=0, **kwargs):
+    """
+    Sends the message to all the RECIPIENTS in parallel, with at most CONCURRENCY messages being sent at the same time.
+    If a TokenBucket BUCKET is given, each attempt takes a token from it first.
+    A delivery that fails because of a rate limit or a server error is tried again up to RETRIES times, after a random
+    delay that doubles after each attempt. A failed delivery (closed DMs, for example) is logged, but doesn't prevent
+    the others.
+    Returns a DeliveryReport.
+    """
+    report = DeliveryReport()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(recipient):
+        """Sends the message to RECIPIENT once, while holding a slot of the semaphore. Returns the error, if any."""
+        async with semaphore:
+            if bucket:
+                await bucket.acquire()
+            try:
+                await recipient.send(content=content, **kwargs)
+            except Exception as e:
+                return e
+
+    async def deliver(recipient):
+        start = time.perf_counter()
+        for attempt in range(retries + 1):
+            error = await send(recipient)
+            if error is None:
+                break
+            if attempt < retries and _is_transient(error):
+                # Waits without the slot of the semaphore, so that the other deliveries go on meanwhile
+                await asyncio.sleep(random.uniform(0.5, 1.5) * SEND_RETRY_DELAY * 2**attempt)
+                continue
+            report.failures[recipient] = error
+            logger.warn("Message couldn't be delivered to %s : %s %s" % (recipient, error.__class__.__name__, error))
+            break
+        report.timings[recipient] = time.perf_counter() - start
+
+    await asyncio.gather(*(deliver(recipient) for recipient in recipients))
+    return report
+
+
 class State(enum.Enum):
     """Represents the state of a game, a step etc"""
     OFF = 0
@@ -1,2 +1,3 @@
 from .game_master import GameMaster
+from .storage import Storage, XmlStorage, SqliteStorage, Flusher, open_storage
 from .extended_bot import ExtendedBot
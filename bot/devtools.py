@@ -178,8 +178,8 @@ class _MockedUser(discord.User):
         if content:
             content = "<To %s> %s" % (self.name, content)
         elif embed:
-            title = embed.title
-            embed.title = "<To %s> %s" % (self.name, title)
+            embed = embed.copy()  # The same embed could be sent to several users at the same time
+            embed.title = "<To %s> %s" % (self.name, embed.title)
         else:
             raise ValueError("One of CONTENT or EMBED should be provided")
 
@@ -195,8 +195,6 @@ class _MockedUser(discord.User):
 
         ret = await self.parent.send(**request)
         self._push_history(ret)
-        if embed and not content:
-            embed.title = title
         return ret
 
     def avatar_url_as(self, *, format=None, static_format='webp', size=1024):
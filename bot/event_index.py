@@ -0,0 +1,65 @@
+import bisect
+import heapq
+import itertools
+
+from game import first_occurrence
+
+
+class EventIndex(object):
+    """
+    The events sorted by start. The occurrences of the events to come from a given datetime are found with a binary
+    search, then walked over lazily : the ones of the recurring events are computed when they're reached only.
+    The starts are kept into a plain sorted list : adding or removing an event finds its place in O(log n), but then
+    shifts the following ones, which is O(n). This memmove is negligible for the few hundred events a server has, and
+    a plain list keeps the lookups and the walks simpler and faster than a balanced tree would.
+    """
+    def __init__(self):
+        self._starts = []  # Sorted (start, name), a recurring event being there with its next occurrence
+        self._names = {}  # Name -> start
+        self._recurring = {}  # Name of a recurring event -> timedelta between two of its occurrences
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        """Yields the names of the events, from the soonest to the latest"""
+        return (name for _, name in self._starts)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def add(self, name, start, every=None):
+        """Adds the event NAME, that begins at the datetime START and happens again EVERY timedelta if given"""
+        if name in self._names:
+            self.remove(name)
+
+        bisect.insort(self._starts, (start, name))
+        self._names[name] = start
+        if every is not None:
+            self._recurring[name] = every
+
+    def remove(self, name):
+        start = self._names.pop(name)
+        self._recurring.pop(name, None)
+        del self._starts[bisect.bisect_left(self._starts, (start, name))]
+
+    def _series(self, name, after):
+        every = self._recurring[name]
+        occurrence = first_occurrence(self._names[name], every, after)
+        while True:
+            yield occurrence, name
+            occurrence += every
+
+    def occurrences(self, after):
+        """Yields the (datetime, name) of all the occurrences of the events at AFTER or later, from the soonest one"""
+        i = bisect.bisect_left(self._starts, (after,))
+        once = (self._starts[j] for j in range(i, len(self._starts)) if self._starts[j][1] not in self._recurring)
+        return heapq.merge(once, *(self._series(name, after) for name in self._recurring))
+
+    def next(self, count, after):
+        """Returns the (datetime, name) of the COUNT first occurrences of the events at AFTER or later"""
+        return list(itertools.islice(self.occurrences(after), count))
+
+    def between(self, start, end):
+        """Returns the (datetime, name) of the occurrences of the events between START (included) and END (excluded)"""
+        return list(itertools.takewhile(lambda occurrence: occurrence[0] < end, self.occurrences(start)))
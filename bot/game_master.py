@@ -1,11 +1,16 @@
 import discord
-from lxml import etree
+import asyncio
 import datetime
+import os
+import time
 
 from .extended_bot import ExtendedBot
-from game import Session, StoryBook, GameEvent, convert_to_datetime, convert_to_str, is_over
+from .storage import Flusher
+from .scheduler import Scheduler
+from .event_index import EventIndex
+from game import Session, StoryBook, Event, GameEvent, When, now, to_datetime, is_over
 from assets.exceptions import *
-from assets.utils import make_mention, configure_logger, StateOwner
+from assets.utils import make_mention, configure_logger, StateOwner, TokenBucket
 import assets.messages as msgs
 import assets.constants as consts
 import assets.logger as logger
@@ -14,165 +19,105 @@ import assets.logger as logger
 configure_logger(logger)
 
 
-class _XmlEventsIO(object):
-    def __init__(self, events):
-        self.events = events
-
-    @staticmethod
-    def _dump_date(node, dated_object):
-        set = node.set
-        set("year", str(dated_object.year))
-        set("month", str(dated_object.month))
-        set("day", str(dated_object.day))
-        set("hour", str(dated_object.hour))
-        set("minute", str(dated_object.minute))
-
-    @staticmethod
-    def _load_date(node):
-        def get(s):
-            return int(node.get(s))
-
-        return datetime.datetime(
-            year=get('year'),
-            month=get('month'),
-            day=get('day'),
-            hour=get('hour'),
-            minute=get('minute')
-        )
-
-    def dump(self, file: str):
-        """Dumps the events into the provided xml FILE"""
-        root = etree.Element("events")
-
-        for name, event in self.events.items():
-            # Event root node
-            event_node = etree.SubElement(root, "event")
-
-            if isinstance(event, GameEvent):
-                event_node.set('type', 'game')
+class GameMaster(ExtendedBot):
+    def __init__(self, games=None, events=None, xp_counts=None, *args, **kwargs):
+        self.games = games or {}
+        self.players_games = {}  # Player id -> name of the game he joined, kept up to date by the sessions
+        self.events = events or {}
+        self.events_index = EventIndex()  # The events sorted by date, kept up to date with self.events
+        self.members_events = {}  # User id -> names of the events he joined, kept up to date with self.events
+        for name in self.events:
+            self._index_event(name)
+        self.xp_counts = xp_counts or {}
+        self.storage = None  # Saves self.events and self.xp_counts, see self.load()
+        self._flusher = None
+        self._users_cache = {}  # User id -> discord.User, for the users discord didn't have in cache
+        self._unreachable_users = {}  # User id -> time.monotonic() until which we don't try to fetch him again
+        self.scheduler = Scheduler()  # Sends the remainders and activates the events, see self._schedule_event()
+        self.dm_bucket = TokenBucket(consts.DM_RATE, consts.DM_BURST)  # Shared by all the events notifications
 
-                # Raw event data (name, date, ...)
-                etree.SubElement(event_node, "name").text = name
-                etree.SubElement(event_node, "home_channel").text = str(event.home_channel.id)
-                date = etree.SubElement(event_node, "date")
-                self._dump_date(node=date, dated_object=event)
+        self.dialogs = StoryBook(consts.DIALOGS_PATH)
+        self._dialogs_mtime = os.stat(consts.DIALOGS_PATH).st_mtime
+        for problem in self.dialogs.validate(consts.DIALOGS_SCHEMA_PATH):
+            logger.warn("%s : %s" % (consts.DIALOGS_PATH, problem))
+        self.voice_channels = {}
+        ExtendedBot.__init__(self, *args, **kwargs)
 
-            else:
-                raise ValueError("One of the event isn't a valid event type")
-
-            # Saving the event members
-            members = etree.SubElement(event_node, "members")
-            for member in event.members.values():
-                member_node = etree.SubElement(members, "member")
-                member_node.set('id', str(member.id))
-                if member == event.admin:
-                    member_node.set('admin', "True")
-
-            # Remainders
-            remainders = etree.SubElement(event_node, "remainders")
-            for remainder in event.remainders:
-                etree.SubElement(remainders, "elem").text = str(remainder.time_from_event)
-
-        with open(file, 'w') as f:
-            f.write(etree.tostring(root, pretty_print=True).decode("utf-8"))
-
-    @classmethod
-    def load(cls, file: str, bot):
+    def load(self, storage):
         """
-        Loads the event of the passed xml FILE. BOT should be connected to discord, otherwise we can't use bot.get_user
+        Loads the events and the xp accounts from the storage backend STORAGE (see bot/storage.py), that is told about
+        every change made to them from then on. The storage is closed if the loading fails, so that it can be tried
+        again.
         """
-        events = {}
-        root = etree.parse(file)
-
-        for event in root.findall("event"):
-            members = []
-            admin = None
-            members_node = event.find("members")
-
-            for member_node in members_node.findall("member"):
-                user = bot.get_user(int(member_node.get('id')))
-                members.append(user)
-                if member_node.get("admin", False):
-                    admin = user
-
-            remainders = []
-            remainders_node = event.find("remainders")
-            for elem in remainders_node.findall("elem"):
-                remainders.append(int(elem.text))
-
-            if event.get("type") == "game":
-                date = cls._load_date(event.find("date"))
-                name = event.find("name").text
-                events[name] = GameEvent(
-                    convert_to_str(date),
-                    event.find("name").text,
-                    admin,
-                    bot.get_channel(int(event.find('home_channel').text)),
-                    remainders
-                )
-
-                for member in members:
-                    events[name].add_member(member)
-
-        return cls(events)
-
-
-class _XmlExperienceIO(object):
-    def __init__(self, xp_counts):
+        self.storage = storage
+        self._flusher = Flusher(self, storage)
+        try:
+            events, xp_counts = storage.load(bot=self)
+        except BaseException:
+            storage.close()
+            self.storage = self._flusher = None
+            raise
+
+        for name in events.keys() - self.events.keys():
+            self.events[name] = events[name]
+            self._index_event(name)
+        xp_counts.update(self.xp_counts)
         self.xp_counts = xp_counts
 
-    def dump(self, file: str):
-        root = etree.Element("xp_counts")
-
-        for user_id, xp in self.xp_counts.items():
-            print(user_id)
-            user_xp = etree.SubElement(root, "user_xp")
-            user_xp.set("id", str(user_id))
-            user_xp.set("xp", str(xp))
-
-        with open(file, 'w') as f:
-            f.write(etree.tostring(root, pretty_print=True).decode("utf-8"))
-
-    @classmethod
-    def load(cls, file: str, bot):
-        xp_counts = {}
-        root = etree.parse(file)
-
-        for user_xp in root.findall("user_xp"):
-            xp_counts[int(user_xp.get("id"))] = int(user_xp.get("xp"))
+        for name, event in self.events.copy().items():
+            if event.over() and event.recurring:
+                self._next_occurrence(name)
+            elif event.over():
+                self.delete_event(name)
+            else:
+                self._schedule_event(name)
+        self.scheduler.start()
 
-        return cls(xp_counts)
+    def dump(self):
+        if self.storage:
+            self.storage.dump(self.events, self.xp_counts)
 
+    def _event_changed(self, name):
+        if self._flusher:
+            self._flusher.event_changed(name)
 
-class GameMaster(ExtendedBot):
-    def __init__(self, games=None, events=None, xp_counts=None, *args, **kwargs):
-        self.games = games or {}
-        self.events = events or {}
-        self.xp_counts = xp_counts or {}
+    def _xp_changed(self, user_id):
+        if self._flusher:
+            self._flusher.xp_changed(user_id)
 
-        self.dialogs = StoryBook(consts.DIALOGS_PATH)
-        self.voice_channels = {}
-        ExtendedBot.__init__(self, *args, **kwargs)
+    # - - - Dialogs - - -
+    async def check_dialogs_changed(self):
+        """
+        Reloads the dialogs if their file was modified since they were last read. A reload that failed (e.g. because
+        the file was still being written) is tried again at the next check.
+        """
+        mtime = os.stat(consts.DIALOGS_PATH).st_mtime
+        if mtime != self._dialogs_mtime and await self.reload_dialogs():
+            self._dialogs_mtime = mtime
 
-    def load(self, events_file, xp_counts_file):
-        def _load_events():
-            self.events = {**_XmlEventsIO.load(events_file, bot=self).events, **self.events}
+    async def reload_dialogs(self):
+        """
+        Reads the dialogs file again, in an executor, and makes the bot and all the games use the new dialogs if they
+        are valid. Returns True if they were, False otherwise.
+        """
+        def read():
+            dialogs = StoryBook(consts.DIALOGS_PATH)
+            return dialogs, dialogs.validate(consts.DIALOGS_SCHEMA_PATH)
 
-        def _load_xps():
-            self.xp_counts = {**_XmlExperienceIO.load(xp_counts_file, bot=self).xp_counts, **self.xp_counts}
+        try:
+            dialogs, problems = await asyncio.get_event_loop().run_in_executor(None, read)
+        except (SyntaxError, ValueError, OSError) as e:  # json.JSONDecodeError is a ValueError
+            problems = ["%s : %s" % (e.__class__.__name__, e)]
 
-        failed = False
-        for data_load in (_load_events, _load_xps):
-            try:
-                data_load()
-            except (SyntaxError, FileNotFoundError) as exc:
-                failed = exc
-        if failed:
-            raise SyntaxError from failed
+        if problems:
+            logger.warn("%s wasn't reloaded : %s" % (consts.DIALOGS_PATH, "; ".join(problems)))
+            return False
 
-    def dump(self, events_file, xp_counts_file):
-        _XmlEventsIO(self.events).dump(events_file)
-        _XmlExperienceIO(self.xp_counts).dump(xp_counts_file)
+        self.dialogs = dialogs
+        for game in self.games.values():
+            game.set_dialogs(dialogs)
+        logger.info("Reloaded %s" % consts.DIALOGS_PATH)
+        return True
 
     # - - - Checks - - -
     def check_game_exists(self, name: str, err_msg: str = None):
@@ -217,17 +162,31 @@ class GameMaster(ExtendedBot):
         if not (self.games[name].off() or self.games[name].active_but_reachable()):
             raise GameRelatedError(msgs.GAME_NOT_AVAILABLE % name)
 
-    def check_has_free_time(self, user_id, when):
-        _when = when if isinstance(when, datetime.datetime) else convert_to_datetime(when)
-        for name, event in {name: e for name, e in self.events.items() if _when == e.dt}.items():
-            if user_id in event.members.keys():
+    def check_has_free_time(self, user_id, when, every=None):
+        """
+        Raises an AvailabilityError if one of the events USER_ID joined overlaps the event at WHEN, that happens again
+        EVERY timedelta if EVERY is given. All the occurrences of the recurring events are taken in account.
+        """
+        _when = to_datetime(when)
+        for name in self.members_events.get(user_id, ()):
+            if self.events[name].overlaps(_when, Event.duration, every):
                 raise AvailabilityError(msgs.NO_FREE_TIME % name)
         return True
 
     @staticmethod
-    def check_datetime_format(when):
+    def parse_every(every):
+        """Returns the datetime.timedelta corresponding to EVERY, a number of days given by a user"""
+        if not every.isdigit() or not 1 <= int(every) <= consts.MAX_RECURRENCE:
+            raise CommandSyntaxError(
+                "La récurrence doit être un nombre de jours entre 1 et %i !" % consts.MAX_RECURRENCE
+            )
+        return datetime.timedelta(days=int(every))
+
+    @staticmethod
+    def parse_when(when):
+        """Returns the When corresponding to the datetime str format WHEN, given by a user"""
         try:
-            convert_to_datetime(when)
+            return When(when)
         except SyntaxError:
             raise CommandSyntaxError("Le format de date est invalide !")
 
@@ -244,9 +203,7 @@ class GameMaster(ExtendedBot):
             return False
 
     def which_game(self, user_id: str):
-        for name, game in self.games.items():
-            if game.has_player(user_id):
-                return name
+        return self.players_games.get(user_id)
 
     def get_admin(self, name: str):
         if self.games.get(name):
@@ -266,11 +223,22 @@ class GameMaster(ExtendedBot):
     def get_opened_games(self):
         return [name for name in self.games.keys() if not self.is_active(name)]
 
-    def get_opened_events(self):
-        return [(name, event.dt) for name, event in self.events.items()]
-
     def get_joined_events(self, user_id):
-        return [(name, event.dt) for name, event in self.events.items() if event.has_member(user_id)]
+        return sorted(
+            ((name, self.events[name].dt) for name in self.members_events.get(user_id, ())),
+            key=lambda event: event[1]
+        )
+
+    def get_next_events(self, count):
+        """
+        Returns the (name, datetime) of the COUNT first occurrences of the events that aren't over, sorted by date. A
+        recurring event appears once for each of its occurrences.
+        """
+        return [(name, dt) for dt, name in self.events_index.next(count, now() - Event.duration)]
+
+    def get_events_between(self, start, end):
+        """Returns the (name, datetime) of the occurrences of the events between START and END, sorted by date"""
+        return [(name, dt) for dt, name in self.events_index.between(start, end)]
 
     def get_game_members(self, name: str):
         return self.games[name].get_players()
@@ -280,10 +248,20 @@ class GameMaster(ExtendedBot):
 
     # - - - Game - - -
     def add_game(self, name, admin, home_channel):
-        self.games[name] = Session(name, admin, home_channel, self.dialogs)
+        self.games[name] = Session(
+            name,
+            admin,
+            home_channel,
+            self.dialogs,
+            players_index=self.players_games,
+            on_ended=self.finish_game,
+            replays_dir=consts.REPLAYS_PATH
+        )
 
     def delete_game(self, name: str):
-        del self.games[name]
+        game = self.games.pop(name)
+        game.forget_players()
+        game.close()
 
     def quit_game(self, user_id: str):
         self.games[self.which_game(user_id)].remove_player(user_id)
@@ -298,15 +276,22 @@ class GameMaster(ExtendedBot):
         await self.games[name].launch()
         if self.games[name].ended():
             await self.voice_channels.pop(name).delete()
-            self.games.pop(name)
+            game = self.games.pop(name)
+            game.forget_players()
+            game.close()
 
     async def react(self, msg):
-        for name, game in self.games.copy().items():
-            if game.has_player(msg.author.id) and game.active():
-                await game.react(msg)
+        """
+        Posts MSG in the inbox of the game its author belongs to, if this game is active. The game processes it on
+        its own, and calls self.finish_game once it is over.
+        """
+        name = self.which_game(msg.author.id)
+        if name is None:
+            return
 
-                if game.ended():
-                    await self.finish_game(name)
+        game = self.games[name]
+        if game.active() and not game.post(msg):
+            await msg.author.send(msgs.INBOX_FULL % (name, msg.content))
 
     async def finish_game(self, name):
         self.games[name].players.values()
@@ -314,36 +299,109 @@ class GameMaster(ExtendedBot):
             if not self.xp_counts.get(_id):
                 self.create_xp_account(_id)
             self.xp_counts[_id] += xp
+            self._xp_changed(_id)
 
         await self.voice_channels.pop(name).delete()
         await self.games[name].home_channel.send(msgs.GAME_HAS_ENDED % name)
-        self.games.pop(name)
+        game = self.games.pop(name)
+        game.forget_players()
+        game.close()
 
     # - - - Events - - -
-    def add_game_event(self, when, name, admin, home_channel):
-        self.events[name] = GameEvent(when, name, admin=admin, home_channel=home_channel)
+    def add_game_event(self, when, name, admin, home_channel, every=None):
+        self.events[name] = GameEvent(when, name, admin=admin, home_channel=home_channel, every=every)
+        self._index_event(name)
+        self._schedule_event(name)
+        self._event_changed(name)
 
     def delete_event(self, name):
-        self.events.pop(name)
+        event = self.events.pop(name)
+        self.events_index.remove(name)
+        for user_id in event.members:
+            self._remove_member_event(user_id, name)
+        self.scheduler.cancel(name)
+        self._event_changed(name)
+
+    def _index_event(self, name):
+        event = self.events[name]
+        self.events_index.add(name, event.dt, event.every)
+        for user_id in event.members:
+            self.members_events.setdefault(user_id, set()).add(name)
+
+    def _remove_member_event(self, user_id, name):
+        names = self.members_events[user_id]
+        names.discard(name)
+        if not names:
+            del self.members_events[user_id]
+
+    def _schedule_event(self, name):
+        """
+        Schedules the remainders and the activation of the event NAME, and its deletion once it's over. A recurring
+        event moves to its next occurrence instead.
+        """
+        event = self.events[name]
+
+        async def over():
+            if event.recurring:
+                self._next_occurrence(name)
+            else:
+                self.delete_event(name)
+
+        self.scheduler.set_timers(name, event.timers(bot=self) + [(event.end(), over)])
+
+    def _next_occurrence(self, name):
+        self.events[name].move_to_next_occurrence()
+        self._index_event(name)
+        self._schedule_event(name)
+        self._event_changed(name)
 
     def quit_event(self, user_id, name):
         self.events[name].remove_member(user_id)
+        self._remove_member_event(user_id, name)
+        self._event_changed(name)
 
     def add_event_member(self, name, member):
         self.events[name].add_member(member)
+        self.members_events.setdefault(member.id, set()).add(name)
+        self._event_changed(name)
+
+    async def resolve_users(self, user_ids):
+        """
+        Returns a user id -> discord.User dict for the USER_IDS, or None for the ones that couldn't be found. The users
+        discord doesn't have in cache are fetched at the same time, by batches of consts.MAX_CONCURRENT_SENDS. A user
+        that couldn't be fetched isn't fetched again during consts.UNREACHABLE_USER_TTL seconds.
+        """
+        users = {}
+        missing = []
+        _now = time.monotonic()
+        for _id in user_ids:
+            users[_id] = self.get_user(_id) or self._users_cache.get(_id)
+            if users[_id] is None and self._unreachable_users.get(_id, 0) <= _now:
+                self._unreachable_users.pop(_id, None)
+                missing.append(_id)
+
+        for i in range(0, len(missing), consts.MAX_CONCURRENT_SENDS):
+            batch = missing[i:i + consts.MAX_CONCURRENT_SENDS]
+            results = await asyncio.gather(*(self.fetch_user(_id) for _id in batch), return_exceptions=True)
+            for _id, user in zip(batch, results):
+                if isinstance(user, Exception):
+                    logger.warn("Could not fetch the user %i : %s" % (_id, user))
+                    self._unreachable_users[_id] = time.monotonic() + consts.UNREACHABLE_USER_TTL
+                    continue
+                users[_id] = self._users_cache[_id] = user
+
+        return users
+
+    async def resolve_event_members(self, name):
+        await self.events[name].resolve_members(bot=self)
 
     async def confirm_presence(self, name, where, user_id):
         await self.events[name].confirm_presence(user_id, where=where, bot=self)
 
-    async def activate_events(self):
-        for name, event in self.events.copy().items():
-            await event.check_and_activate(bot=self)
-            if event.over():
-                self.events.pop(name)
-
     # - - - Experience points - - -
     def create_xp_account(self, user_id):
         self.xp_counts[user_id] = 0
+        self._xp_changed(user_id)
 
     def get_level_info(self, user_id):
         xp = self.xp_counts[user_id]
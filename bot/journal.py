@@ -0,0 +1,51 @@
+import json
+import os
+
+import assets.logger as logger
+from assets.utils import configure_logger
+
+
+configure_logger(logger)
+
+
+class Journal(object):
+    """
+    An append-only journal of the changes made to the bot data (events, xp accounts) since the last snapshot was dumped.
+    Each entry is a json line {"op": ..., ...}, written and flushed as soon as it is recorded, so that a crash only
+    loses the entry being written. All the entries are idempotent, so that an entry replayed twice does no harm.
+    """
+    def __init__(self, file: str, max_size: int):
+        self.file = file
+        self.max_size = max_size
+        self._stream = open(file, 'a', encoding="utf-8")
+
+    def record(self, op, **data):
+        """Appends the operation OP with its DATA to the journal"""
+        self._stream.write(json.dumps({"op": op, **data}) + "\n")
+        self._stream.flush()
+
+    def size(self):
+        return self._stream.tell()
+
+    def is_full(self):
+        return self.size() >= self.max_size
+
+    def entries(self):
+        """Yields the entries of the journal, from the oldest to the newest"""
+        if not os.path.exists(self.file):
+            return
+
+        with open(self.file, encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                try:
+                    yield json.loads(line)
+                except ValueError:  # The process probably died while writing this line
+                    logger.warn("Skipped the corrupted entry %i of the journal %s" % (i, self.file))
+
+    def clear(self):
+        """Drops all the entries. Only call this once a snapshot of the whole data has been written."""
+        self._stream.close()
+        self._stream = open(self.file, 'w', encoding="utf-8")
+
+    def close(self):
+        self._stream.close()
@@ -0,0 +1,105 @@
+import asyncio
+import heapq
+import itertools
+import time
+import traceback
+
+import assets.logger as logger
+from assets.utils import configure_logger
+
+
+configure_logger(logger)
+
+
+class Scheduler(object):
+    """
+    Calls coroutine functions at given datetimes. The timers are kept into a min-heap ordered by due time, and a
+    single task sleeps until the first of them is due : adding or cancelling the timers of a key costs O(log n) per
+    timer, whatever the number of timers waiting.
+    The timers are grouped by key (e.g. an event name). Cancelling a key only bumps its generation, and the stale
+    timers are dropped when they come out of the heap.
+    A timer that is due while the scheduler is late is called as soon as the scheduler wakes up, it's never skipped.
+    """
+    def __init__(self):
+        self._heap = []  # (timestamp, sequence number, key, generation, callback)
+        self._generations = {}
+        self._sequence = itertools.count()
+        self._changed = None
+        self._task = None
+        self._running = set()  # The tasks of the callbacks being called, that asyncio only references weakly
+
+    def __len__(self):
+        return len(self._heap)
+
+    def set_timers(self, key, timers):
+        """
+        Replaces the timers of KEY by TIMERS, a list of (datetime, coroutine function) pairs. The functions are called
+        without arguments. The timers that are already due are dropped.
+        """
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+
+        _now = time.time()
+        for dt, callback in timers:
+            timestamp = dt.timestamp()
+            if timestamp >= _now:
+                heapq.heappush(self._heap, (timestamp, next(self._sequence), key, generation, callback))
+        self._wake_up()
+
+    def cancel(self, key):
+        """Cancels all the timers of KEY"""
+        if self._generations.pop(key, None) is not None:
+            self._wake_up()
+
+    def _wake_up(self):
+        if self._changed:
+            self._changed.set()
+
+    def _pop_due(self):
+        """Pops and returns the callbacks that are due, dropping the cancelled ones"""
+        due = []
+        _now = time.time()
+        while self._heap and self._heap[0][0] <= _now:
+            _, _, key, generation, callback = heapq.heappop(self._heap)
+            if self._generations.get(key) == generation:
+                due.append(callback)
+        return due
+
+    def _next_delay(self):
+        """Returns how long to sleep before the next timer is due, or None if there's none"""
+        while self._heap and self._generations.get(self._heap[0][2]) != self._heap[0][3]:
+            heapq.heappop(self._heap)
+        return max(self._heap[0][0] - time.time(), 0) if self._heap else None
+
+    def start(self):
+        """Starts the scheduling task, if it doesn't run yet. Must be called from the event loop."""
+        if self._task is None or self._task.done():
+            self._changed = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    @staticmethod
+    async def _call(callback):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error("%s %s : %s" % ("".join(traceback.format_tb(e.__traceback__)), e.__class__.__name__, str(e)))
+
+    async def _run(self):
+        while True:
+            for callback in self._pop_due():
+                # Each callback runs in its own task, so that a long one (sending hundreds of messages, for example)
+                # doesn't delay the timers that follow
+                task = asyncio.ensure_future(self._call(callback))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), self._next_delay())
+            except asyncio.TimeoutError:
+                pass
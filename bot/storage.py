@@ -0,0 +1,609 @@
+"""Contains the storage backends of the bot data, i.e. the events and the xp accounts"""
+
+import discord
+from lxml import etree
+import asyncio
+import datetime
+import heapq
+import itertools
+import os
+import sqlite3
+
+from .journal import Journal
+from .xp_store import XpCounts, XpStore
+from game import GameEvent
+from assets.utils import configure_logger
+import assets.constants as consts
+import assets.logger as logger
+
+
+configure_logger(logger)
+
+
+# Records
+# - - - - - - - - -
+
+def event_record(event):
+    """
+    Returns the plain data of EVENT that the backends save, as a dict. Unlike the event itself, it can safely be used
+    from another thread.
+    """
+    return {
+        "type": "game",
+        "datetime": event.dt.isoformat(),
+        "admin": event.admin.id,
+        "home_channel": event.home_channel.id,
+        "members": list(event.members),
+        "remainders": [remainder.time_from_event for remainder in event.remainders],
+        "every": event.every // datetime.timedelta(minutes=1) if event.recurring else None  # In minutes
+    }
+
+
+def _build_event(name, record, bot):
+    """Builds back the event NAME from its RECORD. The members are discord.Object placeholders (see Event)."""
+    event = GameEvent(
+        datetime.datetime.fromisoformat(record["datetime"]),
+        name,
+        discord.Object(id=record["admin"]),
+        bot.get_channel(record["home_channel"]),
+        record["remainders"],
+        every=datetime.timedelta(minutes=record["every"]) if record.get("every") else None
+    )
+    for member_id in record["members"]:
+        if member_id != record["admin"]:
+            event.add_member(discord.Object(id=member_id))
+    return event
+
+
+def _write_atomically(file, content):
+    """Writes CONTENT into FILE through a temporary file, so that FILE is never left half-written"""
+    tmp_file = file + ".tmp"
+    with open(tmp_file, 'w', encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file)
+
+
+# Xml
+# - - - - - - - - -
+
+class _XmlEventsIO(object):
+    def __init__(self, events):
+        self.events = events
+
+    @staticmethod
+    def _dump_date(node, dated_object):
+        set = node.set
+        set("year", str(dated_object.year))
+        set("month", str(dated_object.month))
+        set("day", str(dated_object.day))
+        set("hour", str(dated_object.hour))
+        set("minute", str(dated_object.minute))
+
+    @staticmethod
+    def _load_date(node):
+        def get(s):
+            return int(node.get(s))
+
+        return datetime.datetime(
+            year=get('year'),
+            month=get('month'),
+            day=get('day'),
+            hour=get('hour'),
+            minute=get('minute'),
+            tzinfo=consts.TIMEZONE
+        )
+
+    def dumps(self):
+        """Returns the xml representation of the events, given as records (see event_record)"""
+        root = etree.Element("events")
+
+        for name, record in self.events.items():
+            # Event root node
+            event_node = etree.SubElement(root, "event")
+
+            if record["type"] == "game":
+                event_node.set('type', 'game')
+                if record.get("every"):
+                    event_node.set('every', str(record["every"]))
+
+                # Raw event data (name, date, ...)
+                etree.SubElement(event_node, "name").text = name
+                etree.SubElement(event_node, "home_channel").text = str(record["home_channel"])
+                date = etree.SubElement(event_node, "date")
+                self._dump_date(node=date, dated_object=datetime.datetime.fromisoformat(record["datetime"]))
+
+            else:
+                raise ValueError("One of the event isn't a valid event type")
+
+            # Saving the event members
+            members = etree.SubElement(event_node, "members")
+            for member_id in record["members"]:
+                member_node = etree.SubElement(members, "member")
+                member_node.set('id', str(member_id))
+                if member_id == record["admin"]:
+                    member_node.set('admin', "True")
+
+            # Remainders
+            remainders = etree.SubElement(event_node, "remainders")
+            for remainder in record["remainders"]:
+                etree.SubElement(remainders, "elem").text = str(remainder)
+
+        return etree.tostring(root, pretty_print=True).decode("utf-8")
+
+    @classmethod
+    def load(cls, file: str, bot):
+        """
+        Loads the event of the passed xml FILE, one event node at a time. The members are loaded as discord.Object
+        placeholders, that are resolved the first time they're needed (see Event.resolve_members). BOT should be
+        connected to discord, otherwise we can't use bot.get_channel
+        """
+        events = {}
+
+        for _, event in etree.iterparse(file, events=("end",), tag="event"):
+            members = []
+            admin = None
+            members_node = event.find("members")
+
+            for member_node in members_node.findall("member"):
+                user = discord.Object(id=int(member_node.get('id')))
+                members.append(user)
+                if member_node.get("admin", False):
+                    admin = user
+
+            remainders = []
+            remainders_node = event.find("remainders")
+            for elem in remainders_node.findall("elem"):
+                remainders.append(int(elem.text))
+
+            if event.get("type") == "game":
+                date = cls._load_date(event.find("date"))
+                name = event.find("name").text
+                events[name] = GameEvent(
+                    date,
+                    event.find("name").text,
+                    admin,
+                    bot.get_channel(int(event.find('home_channel').text)),
+                    remainders,
+                    every=datetime.timedelta(minutes=int(event.get("every"))) if event.get("every") else None
+                )
+
+                for member in members:
+                    events[name].add_member(member)
+
+            # We don't need the parsed nodes anymore
+            event.clear()
+            while event.getprevious() is not None:
+                del event.getparent()[0]
+
+        return cls(events)
+
+
+class _XmlExperienceIO(object):
+    def __init__(self, xp_counts):
+        self.xp_counts = xp_counts
+
+    def dumps(self):
+        root = etree.Element("xp_counts")
+
+        for user_id, xp in self.xp_counts.items():
+            user_xp = etree.SubElement(root, "user_xp")
+            user_xp.set("id", str(user_id))
+            user_xp.set("xp", str(xp))
+
+        return etree.tostring(root, pretty_print=True).decode("utf-8")
+
+    def dump(self, file: str):
+        with open(file, 'w') as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def load(cls, file: str, bot):
+        xp_counts = {}
+        root = etree.parse(file)
+
+        for user_xp in root.findall("user_xp"):
+            xp_counts[int(user_xp.get("id"))] = int(user_xp.get("xp"))
+
+        return cls(xp_counts)
+
+
+# Backends
+# - - - - - - - - -
+
+class Storage(object):
+    """
+    Base class of the storage backends. A backend loads the events and the xp accounts, then saves the ones that
+    changed when a Flusher asks it to.
+    """
+    def __init__(self):
+        self._bot = None
+
+    def load(self, bot):
+        """
+        Returns the events (as a name -> Event dict) and the xp accounts (as a user id -> xp XpCounts mapping) saved.
+        BOT should be connected to discord, otherwise we can't use bot.get_channel
+        """
+        raise NotImplementedError()
+
+    def save(self, events, xp_counts):
+        """
+        Saves the changed EVENTS, as a name -> record dict (see event_record) where the deleted events are None, and
+        the changed XP_COUNTS, as a user id -> xp dict. Called from an executor, so it mustn't touch the bot data.
+        Returns True if the backend needs a snapshot of all the events, to be given to self.compact().
+        """
+        raise NotImplementedError()
+
+    def after_save(self, events, xp_counts):
+        """Called from the event loop once EVENTS and XP_COUNTS were saved"""
+        pass
+
+    def compact(self, events):
+        """Saves all the EVENTS records at once, if self.save() asked to. Called from an executor too."""
+        pass
+
+    def dump(self, events, xp_counts):
+        """Saves the whole EVENTS and XP_COUNTS, right now"""
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class XmlStorage(Storage):
+    """
+    Saves the events into an xml file and the xp accounts into an XpStore. As the events file is rewritten as a whole,
+    the changes saved since it was last written go to a Journal, that is replayed at load and compacted into the
+    events file once it grew too big.
+    """
+    def __init__(self, events_file, xp_counts_file, journal_file, journal_max_size=consts.JOURNAL_MAX_SIZE):
+        Storage.__init__(self)
+        self.events_file = events_file
+        self.xp_counts_file = xp_counts_file
+        self.journal = Journal(journal_file, max_size=journal_max_size)
+
+    def load(self, bot):
+        self._bot = bot
+        events = {}
+        try:
+            events = _XmlEventsIO.load(self.events_file, bot=bot).events
+        except (SyntaxError, OSError) as e:  # lxml raises an OSError for missing files
+            logger.warn("Could not load the events of %s : %s" % (self.events_file, e))
+
+        migrate = not os.path.exists(self.xp_counts_file) and os.path.exists(consts.LEGACY_XP_COUNTS_PATH)
+        xp_counts = XpStore(self.xp_counts_file)
+        if migrate:
+            xp_counts.update(_XmlExperienceIO.load(consts.LEGACY_XP_COUNTS_PATH, bot=bot).xp_counts)
+            logger.info("Imported the xp accounts of %s" % consts.LEGACY_XP_COUNTS_PATH)
+
+        replayed = 0
+        for entry in self.journal.entries():
+            self._replay(entry, events, xp_counts)
+            replayed += 1
+        logger.info("Replayed %i journal entrie(s)" % replayed)
+
+        return events, xp_counts
+
+    def _replay(self, entry, events, xp_counts):
+        """Applies again the journal ENTRY to EVENTS and XP_COUNTS"""
+        op = entry.pop("op")
+        if op == "xp":
+            xp_counts[entry["id"]] = entry["xp"]
+        elif op == "event":
+            name = entry.pop("name")
+            events[name] = _build_event(name, entry, self._bot)
+        elif op == "delete_event":
+            events.pop(entry["name"], None)
+
+    def save(self, events, xp_counts):
+        for name, record in events.items():
+            if record is None:
+                self.journal.record("delete_event", name=name)
+            else:
+                self.journal.record("event", name=name, **record)
+
+        for user_id, xp in xp_counts.items():
+            self.journal.record("xp", id=user_id, xp=xp)
+
+        return self.journal.is_full()
+
+    def compact(self, events):
+        _write_atomically(self.events_file, _XmlEventsIO(events).dumps())
+        self.journal.clear()
+        logger.info("Compacted the journal")
+
+    def dump(self, events, xp_counts):
+        if isinstance(xp_counts, XpStore):
+            xp_counts.flush()
+        else:
+            XpStore.write(xp_counts, self.xp_counts_file)
+        self.compact({name: event_record(event) for name, event in events.items()})
+
+    def close(self):
+        self.journal.close()
+
+
+class _SqliteXpCounts(XpCounts):
+    """
+    The xp accounts stored into the xp_counts table of a sqlite database. The new xps are kept in memory until the
+    SqliteStorage saves them, and merged with the saved ones by the ranking.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+        self.unsaved = {}
+
+    def __getitem__(self, user_id):
+        if user_id in self.unsaved:
+            return self.unsaved[user_id]
+
+        row = self._connection.execute("SELECT xp FROM xp_counts WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            raise KeyError(user_id)
+        return row[0]
+
+    def __setitem__(self, user_id, xp):
+        self.unsaved[user_id] = xp
+
+    def __delitem__(self, user_id):
+        found = self.unsaved.pop(user_id, None) is not None
+        with self._connection:
+            found = self._connection.execute("DELETE FROM xp_counts WHERE user_id = ?", (user_id,)).rowcount or found
+        if not found:
+            raise KeyError(user_id)
+
+    def __iter__(self):
+        yield from list(self.unsaved)
+        for row in self._connection.execute("SELECT user_id FROM xp_counts").fetchall():
+            if row[0] not in self.unsaved:
+                yield row[0]
+
+    def __len__(self):
+        saved = self._connection.execute("SELECT COUNT(*) FROM xp_counts").fetchone()[0]
+        if not self.unsaved:
+            return saved
+        return saved + len(self.unsaved) - len(self._saved_ids(self.unsaved))
+
+    def _saved_ids(self, user_ids):
+        rows = self._connection.execute(
+            "SELECT user_id FROM xp_counts WHERE user_id IN (%s)" % ",".join("?" * len(user_ids)), list(user_ids)
+        )
+        return {row[0] for row in rows}
+
+    def forget_saved(self, xp_counts):
+        """Drops the unsaved xps that were saved since, as XP_COUNTS"""
+        for user_id, xp in xp_counts.items():
+            if self.unsaved.get(user_id) == xp:
+                del self.unsaved[user_id]
+
+    def _not_unsaved(self):
+        """Returns the condition that leaves out of a query the accounts with an unsaved xp, and its parameters"""
+        return "user_id NOT IN (%s)" % ",".join("?" * len(self.unsaved)), list(self.unsaved)
+
+    def ranking(self, start=0, count=None):
+        if not self.unsaved:
+            return self._connection.execute(
+                "SELECT user_id, xp FROM xp_counts ORDER BY xp DESC LIMIT ? OFFSET ?",
+                (-1 if count is None else count, start)
+            ).fetchall()
+
+        # The saved accounts are merged with the unsaved ones : none of the first START + COUNT accounts can be
+        # further down in the database
+        condition, params = self._not_unsaved()
+        saved = self._connection.execute(
+            "SELECT user_id, xp FROM xp_counts WHERE %s ORDER BY xp DESC LIMIT ?" % condition,
+            params + [-1 if count is None else start + count]
+        ).fetchall()
+        unsaved = sorted(self.unsaved.items(), key=lambda account: account[1], reverse=True)
+        ranking = heapq.merge(saved, unsaved, key=lambda account: account[1], reverse=True)
+        return list(itertools.islice(ranking, start, None if count is None else start + count))
+
+    def rank(self, user_id):
+        xp = self[user_id]
+        condition, params = self._not_unsaved()
+        saved_above = self._connection.execute(
+            "SELECT COUNT(*) FROM xp_counts WHERE xp > ? AND %s" % condition, [xp] + params
+        ).fetchone()[0]
+        return saved_above + sum(other > xp for other in self.unsaved.values()) + 1
+
+
+class SqliteStorage(Storage):
+    """
+    Saves the events and the xp accounts into a sqlite database. The events are all held in memory by the bot, that
+    indexes them itself (see bot/event_index.py), while the xp accounts are read from the database, indexed by xp for
+    the ranking, when needed instead of being held in memory.
+    self.connection is only used from the event loop. The saves, that run in the executor of the Flusher, go through
+    their own connection instead, so that no transaction can be split or committed by the other thread. The database
+    is in WAL mode, so that the reads never wait for the saves.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            name TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            admin INTEGER NOT NULL,
+            home_channel INTEGER NOT NULL,
+            remainders TEXT NOT NULL,
+            every INTEGER
+        );
+
+        CREATE TABLE IF NOT EXISTS event_members (
+            event TEXT NOT NULL REFERENCES events (name) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (event, user_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS xp_counts (
+            user_id INTEGER PRIMARY KEY,
+            xp INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS xp_counts_by_xp ON xp_counts (xp);
+    """
+
+    def __init__(self, file):
+        Storage.__init__(self)
+        self.file = file
+        self.connection = None
+        self._writer = None
+        self._xp_counts = None
+
+    def load(self, bot):
+        self._bot = bot
+        self.connection = sqlite3.connect(self.file)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(self._SCHEMA)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(events)")]
+        if "every" not in columns:  # Databases created before the recurring events
+            self.connection.execute("ALTER TABLE events ADD COLUMN every INTEGER")
+
+        records = {}
+        rows = self.connection.execute(
+            "SELECT name, type, datetime, admin, home_channel, remainders, every FROM events"
+        )
+        for name, _type, dt, admin, home_channel, remainders, every in rows.fetchall():
+            records[name] = {
+                "type": _type,
+                "datetime": dt,
+                "admin": admin,
+                "home_channel": home_channel,
+                "members": [],
+                "remainders": [int(r) for r in remainders.split(",") if r],
+                "every": every
+            }
+
+        for name, user_id in self.connection.execute("SELECT event, user_id FROM event_members"):
+            records[name]["members"].append(user_id)
+
+        self.connection.commit()
+        self._writer = sqlite3.connect(self.file, check_same_thread=False)  # Used by one executor thread at a time
+        self._writer.execute("PRAGMA foreign_keys = ON")
+
+        self._xp_counts = _SqliteXpCounts(self.connection)
+        return {name: _build_event(name, record, bot) for name, record in records.items()}, self._xp_counts
+
+    def _write_event(self, name, record):
+        self._writer.execute(
+            "INSERT OR REPLACE INTO events (name, type, datetime, admin, home_channel, remainders, every) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                name,
+                record["type"],
+                record["datetime"],
+                record["admin"],
+                record["home_channel"],
+                ",".join(str(r) for r in record["remainders"]),
+                record["every"]
+            )
+        )
+        self._writer.execute("DELETE FROM event_members WHERE event = ?", (name,))
+        self._writer.executemany(
+            "INSERT INTO event_members (event, user_id) VALUES (?, ?)",
+            ((name, user_id) for user_id in record["members"])
+        )
+
+    def save(self, events, xp_counts):
+        with self._writer:
+            for name, record in events.items():
+                if record is None:
+                    self._writer.execute("DELETE FROM events WHERE name = ?", (name,))
+                else:
+                    self._write_event(name, record)
+
+            self._writer.executemany(
+                "INSERT OR REPLACE INTO xp_counts (user_id, xp) VALUES (?, ?)", xp_counts.items()
+            )
+        return False
+
+    def after_save(self, events, xp_counts):
+        self._xp_counts.forget_saved(xp_counts)
+
+    def dump(self, events, xp_counts):
+        records = {name: event_record(event) for name, event in events.items()}
+        with self._writer:
+            self._writer.execute(
+                "DELETE FROM events WHERE name NOT IN (%s)" % ",".join("?" * len(records)), list(records)
+            )
+        if xp_counts is self._xp_counts:
+            unsaved = dict(xp_counts.unsaved)
+            self.save(records, unsaved)
+            xp_counts.forget_saved(unsaved)
+        else:
+            self.save(records, dict(xp_counts))
+
+    def close(self):
+        for connection in (self.connection, self._writer):
+            if connection is not None:
+                connection.close()
+
+
+def open_storage(backend):
+    """Returns the storage backend named BACKEND ("xml" or "sqlite"), using the paths of assets/constants.py"""
+    if backend == "xml":
+        return XmlStorage(consts.EVENTS_PATH, consts.XP_COUNTS_PATH, consts.JOURNAL_PATH)
+    elif backend == "sqlite":
+        return SqliteStorage(consts.DATABASE_PATH)
+    raise ValueError("Unknown storage backend %s" % backend)
+
+
+# Flusher
+# - - - - - - - - -
+
+class Flusher(object):
+    """
+    Saves the changes made to the bot data in the background. The events and xp accounts that changed are marked as
+    dirty, then saved all at once by the storage backend, from an executor, at most every DELAY seconds.
+    """
+    def __init__(self, bot, storage, delay=consts.FLUSH_DELAY):
+        self.bot = bot
+        self.storage = storage
+        self.delay = delay
+        self.dirty_events = set()
+        self.dirty_xp_counts = set()
+        self._lock = asyncio.Lock()
+        self._scheduled = None
+
+    def event_changed(self, name):
+        self.dirty_events.add(name)
+        self._schedule()
+
+    def xp_changed(self, user_id):
+        self.dirty_xp_counts.add(user_id)
+        self._schedule()
+
+    def _schedule(self):
+        if self._scheduled is None:
+            self._scheduled = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        self._scheduled = None
+        await self.flush()
+
+    async def flush(self):
+        """Saves the dirty events and xp accounts now"""
+        async with self._lock:
+            names, user_ids = self.dirty_events, self.dirty_xp_counts
+            self.dirty_events, self.dirty_xp_counts = set(), set()
+            if not (names or user_ids):
+                return
+
+            events = {name: event_record(self.bot.events[name]) if name in self.bot.events else None for name in names}
+            xp_counts = {_id: self.bot.xp_counts[_id] for _id in user_ids if _id in self.bot.xp_counts}
+            loop = asyncio.get_event_loop()
+
+            try:
+                needs_compaction = await loop.run_in_executor(None, self.storage.save, events, xp_counts)
+                self.storage.after_save(events, xp_counts)
+
+                if needs_compaction:
+                    await self.bot.xp_counts.flush_in_background(loop)
+                    records = {name: event_record(event) for name, event in self.bot.events.items()}
+                    await loop.run_in_executor(None, self.storage.compact, records)
+
+            except Exception as e:
+                logger.error("Saving failed, retrying later : %s : %s" % (e.__class__.__name__, e))
+                self.dirty_events |= names
+                self.dirty_xp_counts |= user_ids
+                self._schedule()
@@ -0,0 +1,182 @@
+import collections.abc
+import mmap
+import os
+import struct
+
+
+class XpCounts(collections.abc.MutableMapping):
+    """Base class of the user id -> xp mappings the storage backends provide"""
+
+    def ranking(self, start=0, count=None):
+        """Returns the (user id, xp) accounts from the START-th best to the START+COUNT-th best"""
+        ranking = sorted(self.items(), key=lambda account: account[1], reverse=True)
+        return ranking[start:None if count is None else start + count]
+
+    def rank(self, user_id):
+        """Returns the rank of USER_ID among the users, starting from 1"""
+        xp = self[user_id]
+        return sum(1 for other_xp in self.values() if other_xp > xp) + 1
+
+    def flush(self):
+        """Writes the changes to the disk"""
+        pass
+
+    async def flush_in_background(self, loop):
+        """Same as self.flush(), but without blocking the event loop LOOP"""
+        await loop.run_in_executor(None, self.flush)
+
+
+class XpStore(XpCounts):
+    """
+    The xp accounts of the users, as a user id -> xp mapping stored into a binary file of fixed-width records
+    (user id, xp) sorted by user id. The file is memory-mapped : opening it costs nothing whatever its size, a lookup
+    is a binary search over the records, and the xp of a known user is updated in place.
+    Accounts created or deleted since the file was opened are kept in memory until self.flush() rewrites the file.
+    """
+
+    _RECORD = struct.Struct("<Qq")
+
+    def __init__(self, file: str):
+        self.file = file
+        self._new = {}
+        self._deleted = set()
+        self._changes = None  # User id -> xp (None if deleted) changed while the file is rewritten in the background
+        self._fd = None
+        self._mm = None
+        self._count = 0
+        self._map()
+
+    def _map(self):
+        if not os.path.exists(self.file):
+            open(self.file, 'wb').close()
+
+        size = os.path.getsize(self.file)
+        if size % self._RECORD.size:
+            raise SyntaxError("%s isn't a valid xp file" % self.file)
+
+        self._count = size // self._RECORD.size
+        if self._count:  # An empty file can't be mapped
+            self._fd = open(self.file, 'r+b')
+            self._mm = mmap.mmap(self._fd.fileno(), 0)
+
+    def _unmap(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._fd.close()
+        self._mm = self._fd = None
+        self._count = 0
+
+    def _record(self, i):
+        return self._RECORD.unpack_from(self._mm, i * self._RECORD.size)
+
+    def _find(self, user_id):
+        """Returns the index of the record of USER_ID in the file, or None if there's none"""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            _id = self._record(mid)[0]
+            if _id == user_id:
+                return mid
+            elif _id < user_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def __getitem__(self, user_id):
+        if user_id in self._new:
+            return self._new[user_id]
+
+        i = None if user_id in self._deleted else self._find(user_id)
+        if i is None:
+            raise KeyError(user_id)
+        return self._record(i)[1]
+
+    def __setitem__(self, user_id, xp):
+        if self._changes is not None:
+            self._changes[user_id] = xp
+        i = None if user_id in self._deleted else self._find(user_id)
+        if i is None:
+            self._new[user_id] = xp
+        else:
+            self._RECORD.pack_into(self._mm, i * self._RECORD.size, user_id, xp)
+
+    def __delitem__(self, user_id):
+        if self._changes is not None:
+            self._changes[user_id] = None
+
+        if user_id in self._new:
+            del self._new[user_id]
+        elif user_id not in self._deleted and self._find(user_id) is not None:
+            self._deleted.add(user_id)
+        else:
+            raise KeyError(user_id)
+
+    def __iter__(self):
+        for i in range(self._count):
+            user_id = self._record(i)[0]
+            if user_id not in self._deleted:
+                yield user_id
+        yield from list(self._new)
+
+    def __len__(self):
+        return self._count - len(self._deleted) + len(self._new)
+
+    def __repr__(self):
+        return "<XpStore '%s' : %i account(s)>" % (self.file, len(self))
+
+    @classmethod
+    def write(cls, xp_counts, file: str):
+        """Writes the mapping XP_COUNTS into FILE, using a temporary file so that FILE is never left half-written"""
+        tmp_file = file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            for user_id in sorted(xp_counts):
+                f.write(cls._RECORD.pack(user_id, xp_counts[user_id]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, file)
+
+    def flush(self):
+        """Writes the changes to the disk, rewriting the file if accounts were created or deleted"""
+        if self._new or self._deleted:
+            snapshot = dict(self.items())
+            self._unmap()
+            self.write(snapshot, self.file)
+            self._new.clear()
+            self._deleted.clear()
+            self._map()
+        elif self._mm is not None:
+            self._mm.flush()
+
+    async def flush_in_background(self, loop):
+        """
+        Same as self.flush(), but the file is written and synced from an executor. The snapshot is taken, and the new
+        file is mapped, from the event loop LOOP : the changes made meanwhile are applied again to the new file.
+        """
+        if not (self._new or self._deleted):
+            if self._mm is not None:
+                await loop.run_in_executor(None, self._mm.flush)
+            return
+
+        snapshot = dict(self.items())
+        new_file = self.file + ".new"
+        self._changes = {}
+        try:
+            await loop.run_in_executor(None, self.write, snapshot, new_file)
+        finally:
+            changes, self._changes = self._changes, None
+
+        self._unmap()
+        os.replace(new_file, self.file)
+        self._new.clear()
+        self._deleted.clear()
+        self._map()
+        for user_id, xp in changes.items():
+            if xp is None:
+                self.pop(user_id, None)
+            else:
+                self[user_id] = xp
+
+    def close(self):
+        self.flush()
+        self._unmap()
@@ -1,9 +1,11 @@
+import datetime
+
 from bot import GameMaster
-from assets.constants import EVENTS_CHANNEL
+from assets.constants import EVENTS_CHANNEL, LISTED_EVENTS
 from assets.utils import configure_logger
 import assets.logger as logger
 import assets.messages as msgs
-from game.events import convert_to_str, clean_str_dt
+from game.events import clean_str_dt
 
 
 configure_logger(logger)
@@ -28,8 +30,9 @@ La date ne doit comporter AUCUN espace !
 Aides des commandes:
 -------------------
 
-calendar add Type Nom Quand  ->  Programme un événement de ce type avec ce nom pour cette date. Un seul type \
-("game") est pour l'instant disponible, ce qui donne donc toujours $calendar add game Nom Quand
+calendar add Type Nom Quand (TousLesNJours)  ->  Programme un événement de ce type avec ce nom pour cette date. Un \
+seul type ("game") est pour l'instant disponible, ce qui donne donc toujours $calendar add game Nom Quand. Si \
+TousLesNJours est précisé, l'événement se répète tous les N jours (par exemple 7 pour une partie chaque semaine)
 
 calendar subscribe NomDeLEvenement  ->  Vous ajoute à cette partie. Vous en recevrez donc les notifications
 
@@ -39,7 +42,9 @@ calendar present NomDeLEvenement  ->  Confirme votre présence à l'événement
 
 calendar when NomDeLEvenement  ->  Retourne la date de cet événement
 
-calendar list  ->  Liste les événements disponibles sur le serveur
+calendar list  ->  Liste les prochains événements disponibles sur le serveur
+
+calendar day (Jour)  ->  Liste les événements de ce jour (jour/mois OU "today+"jours), ou d'aujourd'hui
 
 calendar me  ->  Affiche les événements auquels vous êtes inscrits
 
@@ -67,19 +72,20 @@ def __implement__(bot: GameMaster):
             await ctx.channel.send(msgs.BAD_EVENT_TYPE % (ctx.message.content.strip().split()[2:3] or "[pas de type]"))
 
     @add.command()
-    async def game(ctx, name=None, when=None):
+    async def game(ctx, name=None, when=None, every=None):
         try:
-            bot.check_parameter(name, "$calendar add game NomDuJeu Quand", "NomDuJeu")
-            bot.check_parameter(when, "$calendar add game NomDuJeu Quand", "Quand")
-            bot.check_datetime_format(when)
+            bot.check_parameter(name, "$calendar add game NomDuJeu Quand (TousLesNJours)", "NomDuJeu")
+            bot.check_parameter(when, "$calendar add game NomDuJeu Quand (TousLesNJours)", "Quand")
+            when = bot.parse_when(when)
+            every = bot.parse_every(every) if every else None
             bot.check_is_not_over(when)
-            bot.check_has_free_time(ctx.author.id, when)
+            bot.check_has_free_time(ctx.author.id, when, every)
             bot.check_name_is_available(name)
         except Exception as e:
             await ctx.channel.send(e)
             return
 
-        bot.add_game_event(when, name, ctx.author, ctx.channel)
+        bot.add_game_event(when, name, ctx.author, ctx.channel, every=every)
         await ctx.channel.send(msgs.EVENT_SUCCESSFULLY_CREATED % name)
         await bot.get_channel(EVENTS_CHANNEL).send(
             msgs.NEW_EVENT % (name, "jeu", ctx.author.mention, clean_str_dt(when), name)
@@ -90,11 +96,12 @@ def __implement__(bot: GameMaster):
         try:
             bot.check_parameter(name, "$calendar subscribe NomDeLEvenement", "NomDeLEvenement")
             bot.check_event_exists(name)
-            bot.check_has_free_time(ctx.author.id, bot.events[name].dt)
+            bot.check_has_free_time(ctx.author.id, bot.events[name].dt, bot.events[name].every)
         except Exception as e:
             await ctx.channel.send(e)
             return
 
+        await bot.resolve_event_members(name)
         bot.add_event_member(name, ctx.author)
         await bot.get_admin(name).send(msgs.SOMEONE_JOINED_YOUR_EVENT % (ctx.author.mention, name))
         await ctx.channel.send(msgs.EVENT_SUCCESSFULLY_SUBSCRIBED % name)
@@ -110,7 +117,8 @@ def __implement__(bot: GameMaster):
             await ctx.channel.send(e)
             return
 
-        if bot.get_admin(name) == ctx.author:
+        await bot.resolve_event_members(name)
+        if bot.get_admin(name).id == ctx.author.id:
             await ctx.channel.send(msgs.CONFIRM_FOR_EVENT_DESTRUCTION % name)
             confirm = await bot.confirm(ctx.author, "$calendar quit (admin)")
 
@@ -130,17 +138,36 @@ def __implement__(bot: GameMaster):
 
     @calendar.command(name="list")
     async def _list(ctx):
-        events = ["%s (%s)" % (name, clean_str_dt(convert_to_str(dt))) for name, dt in bot.get_opened_events()]
+        events = ["%s (%s)" % (name, clean_str_dt(dt)) for name, dt in bot.get_next_events(LISTED_EVENTS)]
         if events:
             await ctx.channel.send(embed=msgs.OPENED_EVENTS_LIST.build(events="\n- ".join(events)))
         else:
             await ctx.channel.send(embed=msgs.NO_OPENED_EVENT.build())
 
+    @calendar.command()
+    async def day(ctx, which=None):
+        try:
+            start = bot.parse_when(which + ",00:00" if which else "00:00").dt
+        except Exception as e:
+            await ctx.channel.send(e)
+            return
+
+        events = [
+            "%s (%02i:%02i)" % (name, dt.hour, dt.minute)
+            for name, dt in bot.get_events_between(start, start + datetime.timedelta(days=1))
+        ]
+        date = "%02i/%02i" % (start.day, start.month)
+        if events:
+            await ctx.channel.send(embed=msgs.DAY_EVENTS_LIST.build(date=date, events="\n- ".join(events)))
+        else:
+            await ctx.channel.send(embed=msgs.NO_EVENT_THAT_DAY.build(date=date))
+
     @calendar.command()
     async def present(ctx, name=None):
         try:
             bot.check_parameter(name, "$calendar present NomDeLEvenement", "NomDeLEvenement")
             bot.check_event_exists(name)
+            await bot.resolve_event_members(name)
             await bot.confirm_presence(name, ctx.channel, ctx.author.id)
         except Exception as e:
             await ctx.channel.send(e)
@@ -152,7 +179,7 @@ def __implement__(bot: GameMaster):
     @calendar.command()
     async def me(ctx):
         events = [
-            "%s (%s)" % (name, clean_str_dt(convert_to_str(dt))) for name, dt in bot.get_joined_events(ctx.author.id)
+            "%s (%s)" % (name, clean_str_dt(dt)) for name, dt in bot.get_joined_events(ctx.author.id)
         ]
         if events:
             await ctx.channel.send(embed=msgs.GET_JOINED_EVENTS.build(events="\n- ".join(events)))
@@ -168,6 +195,8 @@ def __implement__(bot: GameMaster):
             await ctx.channel.send(e)
             return
 
+        await bot.resolve_event_members(name)
+
         await ctx.channel.send(embed=msgs.GET_EVENT_MEMBERS.build(
             members=",\n- ".join(m.display_name for m in bot.get_event_members(name)),
             name=name
@@ -181,7 +210,7 @@ def __implement__(bot: GameMaster):
         except Exception as e:
             await ctx.channel.send(e)
 
-        await ctx.channel.send(msgs.GET_EVENT_DATE % (name, clean_str_dt(convert_to_str(bot.events[name].dt))))
+        await ctx.channel.send(msgs.GET_EVENT_DATE % (name, clean_str_dt(bot.events[name].dt)))
 
     @calendar.command()
     async def notify(ctx, name, *msg):
@@ -192,6 +221,7 @@ def __implement__(bot: GameMaster):
             await ctx.channel.send(e)
             return
 
-        await bot.events[name].notify(ctx.author.name + " : " + " ".join(msg))
+        await bot.resolve_event_members(name)
+        await bot.events[name].notify(ctx.author.name + " : " + " ".join(msg), bot)
 
 
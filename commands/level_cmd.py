@@ -1,5 +1,4 @@
 import discord
-from collections import OrderedDict
 from assets import messages as msgs
 from bot.game_master import GameMaster
 from assets.utils import make_mention
@@ -40,34 +39,20 @@ def __implement__(bot: GameMaster):
         if not bot.xp_counts.get(ctx.author.id):
             bot.create_xp_account(ctx.author.id)
 
-        xps = OrderedDict(sorted(bot.xp_counts.items(), key=lambda t: t[1]))
-        around = ()
+        xps = bot.xp_counts
         _FORMAT = "%i - %s, %s xp"
 
         if len(xps) > 10:
-            top = [(k, v) for k, v in xps[-3:].items()]
-            for i, _id in enumerate(xps.keys()):
-                if _id == ctx.author.id:
-                    if i < 3:
-                        around = [(k, v) for k, v in xps[-3:].items()]
-                    else:
-                        around = [(k, v) for k, v in xps[i-1:i+2].items()]
-                    break
-
+            # The 3 best players, then the author and the players just before and after him
+            around = max(xps.rank(ctx.author.id) - 2, 3)
             ranks = [
-                _FORMAT % (1, make_mention(top[0][0]), top[0][1]),
-                _FORMAT % (2, make_mention(top[1][0]), top[1][1]),
-                _FORMAT % (3, make_mention(top[2][0]), top[2][1]),
+                _FORMAT % (i+1, make_mention(_id), xp) for i, (_id, xp) in enumerate(xps.ranking(0, 3))
             ] + ['...'] + [
-                _FORMAT % (i, make_mention(around[0][0]), around[0][1]),
-                _FORMAT % (i+1, make_mention(around[1][0]), around[1][1]),
-                _FORMAT % (i+2, make_mention(around[2][0]), around[2][1]),
+                _FORMAT % (around+i+1, make_mention(_id), xp) for i, (_id, xp) in enumerate(xps.ranking(around, 3))
             ]
 
         else:
-            ranks = [
-                _FORMAT % (i+1, make_mention(info[0]), info[1]) for i, info in enumerate(reversed(xps.items()))
-            ]
+            ranks = [_FORMAT % (i+1, make_mention(_id), xp) for i, (_id, xp) in enumerate(xps.ranking())]
 
         await ctx.channel.send(embed=msgs.GET_RANKS.build(ranks="\n".join(ranks)))
 
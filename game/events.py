@@ -2,12 +2,14 @@
 
 import discord
 import datetime
+import functools
+import math
 import time
 import re
 
-from assets.constants import TIMEZONE
+from assets.constants import TIMEZONE, EVENT_DURATION, SEND_RETRIES
 from assets.exceptions import *
-from assets.utils import configure_logger
+from assets.utils import configure_logger, broadcast
 import assets.messages as msgs
 import assets.logger as logger
 
@@ -47,8 +49,14 @@ def convert_to_datetime(s: str):
     """
     Converts S to a datetime.datetime object. S must be formatted like this :
         (<day>/<month>|today\+<forward>)?,<hour>:<minute>
+    The conversions are cached : S always means the same datetime during a whole day.
     """
+    return _convert_to_datetime(s, now().date())
 
+
+@functools.lru_cache(maxsize=256)
+def _convert_to_datetime(s: str, today: datetime.date):
+    """Converts S to a datetime.datetime object, TODAY being the current date. See convert_to_datetime()."""
     match = _DATETIME_REGEX.match(s)
     if not match:
         raise SyntaxError("Invalid datetime format has been passed")
@@ -60,7 +68,7 @@ def convert_to_datetime(s: str):
         else:
             return ret
 
-    _now = now()
+    _now = datetime.datetime(today.year, today.month, today.day, tzinfo=TIMEZONE)
     year = _now.year
     day = get('day')
     month = get('month')
@@ -69,10 +77,7 @@ def convert_to_datetime(s: str):
     minute = get('minute')
 
     if forward:
-        dt = datetime.datetime.fromtimestamp(
-            time.time() + (forward * 3600 * 24),
-            tz=TIMEZONE
-        ).replace(hour=hour, minute=minute)
+        dt = (_now + datetime.timedelta(days=forward)).replace(hour=hour, minute=minute)
 
     elif day:
         if month < _now.month or (month == _now.month and day < _now.day):
@@ -98,18 +103,59 @@ def convert_to_str(dt: datetime.datetime):
     return ret
 
 
-def is_over(when: str):
+def first_occurrence(start, every, after):
+    """
+    Returns the first occurrence at AFTER or later of the event starting at START and happening again EVERY timedelta
+    (never again if EVERY is None), or None if there's none
+    """
+    if after <= start:
+        return start
+    elif every is None:
+        return None
+    return start - ((start - after) // every) * every  # start + ceil((after - start) / every) * every
+
+
+def to_datetime(when):
+    """Returns the datetime.datetime WHEN refers to. WHEN can be a datetime str format, a When or a datetime."""
+    if isinstance(when, When):
+        return when.dt
+    elif isinstance(when, datetime.datetime):
+        return when
+    return convert_to_datetime(when)
+
+
+def is_over(when):
     """Returns True if the described date and time belong to the past else False"""
-    return now() > convert_to_datetime(when)
+    return now() > to_datetime(when)
 
 
 def clean_str_dt(when):
-    """Clean the datetime str format WHEN"""
-    dt = convert_to_datetime(when)
-    if (dt.year, dt.month, dt.day) == (now().year, now().month, now().day):
+    """Clean the datetime str format WHEN. WHEN can also be a When or a datetime."""
+    dt = to_datetime(when)
+    if dt.date() == now().date():
         return "%02i:%02i" % (dt.hour, dt.minute)
     else:
-        return convert_to_str(convert_to_datetime(when)).replace(',', ', ')
+        return convert_to_str(dt).replace(',', ', ')
+
+
+class When(object):
+    """
+    A datetime str format given by a user, parsed once and for all. Pass it instead of the str to the checks and to
+    the events, that would parse it again otherwise.
+    Raises a SyntaxError if the format is invalid.
+    """
+
+    __slots__ = ('text', 'dt')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.dt = convert_to_datetime(text)
+
+    def __repr__(self):
+        return "<When '%s' : %s>" % (self.text, self.dt)
+
+    def __str__(self):
+        return convert_to_str(self.dt)
 
 
 # Core
@@ -186,28 +232,37 @@ class Remainder(_BaseEvent):
 
 
 class Event(_BaseEvent):
-    """Represents an Event that has a date, a time and a description, and that owns several remainders"""
+    """
+    Represents an Event that has a date, a time and a description, and that owns several remainders.
+    The admin and the members can be given as discord.Object placeholders, that only know the user id : they are
+    replaced by the actual users when self.resolve_members() is called.
+    An event that happens again EVERY datetime.timedelta only holds its next occurrence : once it's over, call
+    self.move_to_next_occurrence() instead of deleting it.
+    """
+
+    duration = datetime.timedelta(minutes=EVENT_DURATION)
 
     def __init__(self,
-                 when: str,
+                 when,
                  description: str,
                  admin: discord.User,
                  bef_remainder_desc=None,
                  aft_remainder_desc=None,
-                 _remainders=None
+                 _remainders=None,
+                 every=None
                  ):
 
-        _BaseEvent.__init__(self, convert_to_datetime(when), description)
+        _BaseEvent.__init__(self, to_datetime(when), description)
 
         self.admin = admin
         self.members = {admin.id: admin}
         self.present_members = set()
 
-        _remainders = _remainders or (-3, -2, -1, 1, 2, 3)
+        self.every = every
+        self._remainders = _remainders or (-3, -2, -1, 1, 2, 3)
         self.bef_remainder_desc = bef_remainder_desc
         self.aft_remainder_desc = aft_remainder_desc
-        self.bef_remainders = self._get_remainders(self.timestamp(), (r for r in _remainders if r < 0))
-        self.aft_remainders = self._get_remainders(self.timestamp(), (r for r in _remainders if r > 0))
+        self._set_remainders()
 
     def __repr__(self):
         return "<Event '%s' on %02i/%02i, %02i:%02i>" % (self.description, self.day, self.month, self.hour, self.minute)
@@ -217,6 +272,45 @@ class Event(_BaseEvent):
         """Returns self.bef_remainders + self.aft_remainders"""
         return self.bef_remainders + self.aft_remainders
 
+    @property
+    def recurring(self):
+        return self.every is not None
+
+    def _set_remainders(self):
+        self.bef_remainders = self._get_remainders(self.timestamp(), (r for r in self._remainders if r < 0))
+        self.aft_remainders = self._get_remainders(self.timestamp(), (r for r in self._remainders if r > 0))
+
+    def overlaps(self, start, duration, every=None):
+        """
+        Returns True if one of the occurrences of self overlaps one of the occurrences of the event that starts at
+        START, lasts DURATION and happens again EVERY timedelta if EVERY is given
+        """
+        if every is not None and self.recurring:
+            # Far enough in the future, the gap between two occurrences of the events can be any multiple of the
+            # greatest common divisor of their periods : there's an overlap if one of these gaps is small enough
+            microsecond = datetime.timedelta(microseconds=1)
+            gcd = math.gcd(every // microsecond, self.every // microsecond) * microsecond
+            gap = (start - self.dt) % gcd
+            return gap < self.duration or gcd - gap < duration
+
+        # Only the first occurrence that doesn't end before the other event begins can overlap it
+        instant = datetime.timedelta(microseconds=1)
+        if every is None:
+            occurrence = first_occurrence(self.dt, self.every, start - self.duration + instant)
+            return occurrence is not None and occurrence < start + duration
+        occurrence = first_occurrence(start, every, self.dt - duration + instant)
+        return occurrence < self.dt + self.duration
+
+    def move_to_next_occurrence(self):
+        """
+        Makes self the first occurrence of the recurring event that isn't over yet, skipping the ones missed. The
+        members stay, but have to confirm their presence again.
+        """
+        missed = (now() - self.end()) // self.every + 1
+        _BaseEvent.__init__(self, self.dt + max(missed, 1) * self.every, self.raw_description)
+        self._set_remainders()
+        self.present_members.clear()
+
     def _get_remainders(self, initial_stamp, _list):
         """Returns a list of COUNT Remainder object(s)"""
         remainders = []
@@ -247,6 +341,21 @@ class Event(_BaseEvent):
         """Returns the list of the event members"""
         return list(self.members.values())
 
+    def unresolved_members(self):
+        """Returns the ids of the members that are still discord.Object placeholders"""
+        return [_id for _id, member in self.members.items() if isinstance(member, discord.Object)]
+
+    async def resolve_members(self, bot):
+        """Replaces the members placeholders by the actual users, fetched all at once by BOT.resolve_users"""
+        unresolved = self.unresolved_members()
+        if not unresolved:
+            return
+
+        for _id, user in (await bot.resolve_users(unresolved)).items():
+            if user is not None and _id in self.members:
+                self.members[_id] = user
+        self.admin = self.members.get(self.admin.id, self.admin)
+
     async def confirm_presence(self, user_id, where, bot):
         """
         Confirm that the user is present for the event.
@@ -266,24 +375,38 @@ class Event(_BaseEvent):
         self.present_members.add(user_id)
         await self.on_presence_confirm(bot.get_user(user_id), where, bot)
 
-    async def check_and_activate(self, bot):
+    def timers(self, bot):
         """
-        Checks if the event (or one of the remainders) corresponds to the current date and time and notify all members
-        with its description if yes. In case it's the event that corresponds, it calls self.activate() too.
+        Returns the (datetime, coroutine function) pairs that have to be called at these datetimes for the remainders
+        and the activation of the event, from the soonest to the latest
         """
-        for remainder in self.bef_remainders:
-            if remainder.on_now():
-                await self.notify(remainder.description)
-
-        for remainder in self.aft_remainders:
-            if remainder.on_now():
-                for _id, member in self.members.items():
-                    if _id not in self.present_members:
-                        await member.send(remainder.description)
+        timers = [(remainder.dt, self._remind_callback(remainder, bot)) for remainder in self.bef_remainders]
+        timers.append((self.dt, self._start_callback(bot)))
+        timers.extend((remainder.dt, self._remind_callback(remainder, bot)) for remainder in self.aft_remainders)
+        return timers
+
+    def end(self):
+        """Returns the datetime of the latest remainder, after which the event is over"""
+        return self.aft_remainders[-1].dt if self.aft_remainders else self.dt
+
+    def _remind_callback(self, remainder, bot):
+        async def remind():
+            # The absents are known before anything is awaited : once the last remainder is due, a recurring event
+            # can move to its next occurrence, and forget who was present, at any time
+            absents = [_id for _id in self.members if _id not in self.present_members]
+            await self.resolve_members(bot)
+            if remainder.time_from_event < 0:
+                await self.notify(remainder.description, bot)
+            else:
+                await self.notify(remainder.description, bot, only=absents)
+        return remind
 
-        if self.on_now():
+    def _start_callback(self, bot):
+        async def start():
+            await self.resolve_members(bot)
             await self.activate(bot=bot)
-            await self.notify(self.description)
+            await self.notify(self.description, bot)
+        return start
 
     async def activate(self, bot):
         """Override this to do specific actions when the event is activated"""
@@ -293,10 +416,35 @@ class Event(_BaseEvent):
         """Override this to reacts to a user's presence confirmation"""
         pass
 
-    async def notify(self, msg):
-        """Sends MSG to all the event members"""
-        for member in self.members.values():
-            await member.send(msg)
+    async def notify(self, msg, bot, only=None):
+        """
+        Sends MSG to all the event members, or to the ONLY ones (a list of ids) if provided, in parallel but under the
+        direct messages rate limit of BOT. The members should have been resolved before.
+        If some messages couldn't be delivered, the admin receives the list of the members that missed it.
+        Returns the assets.utils.DeliveryReport.
+        """
+        recipients = []
+        for _id in self.members if only is None else only:
+            member = self.members.get(_id)
+            if member is None:  # He quit the event in the meantime
+                continue
+            if isinstance(member, discord.Object):
+                logger.warn("Could not notify the unresolved user %i" % member.id)
+                continue
+            recipients.append(member)
+
+        report = await broadcast(recipients, msg, bucket=bot.dm_bucket, retries=SEND_RETRIES)
+        logger.info("Notified %i member(s) of %s, %i failed" % (len(report.delivered), self, len(report.failures)))
+
+        if report.failures and not isinstance(self.admin, discord.Object):
+            missed = ", ".join(member.display_name for member in report.failures)
+            try:
+                await self.admin.send(msgs.NOTIFICATION_REPORT % (
+                    msg.strip(), len(report.failures), len(recipients), missed
+                ))
+            except discord.DiscordException as e:
+                logger.warn("Could not send the notification report to %s : %s" % (self.admin, e))
+        return report
 
     def over(self):
         """Return True if the event is over (the latest Remainder was done), False otherwise"""
@@ -319,6 +467,7 @@ class GameEvent(Event):
                  admin,
                  home_channel,
                  _remainders=None,
+                 every=None
                  ):
 
         self.home_channel = home_channel
@@ -339,9 +488,15 @@ class GameEvent(Event):
             admin=admin,
             _remainders=_remainders,
             bef_remainder_desc=bef_remainder_desc % (name, smiley),
-            aft_remainder_desc=aft_remainder_desc % (name, smiley)
+            aft_remainder_desc=aft_remainder_desc % (name, smiley),
+            every=every
         )
 
+    def move_to_next_occurrence(self):
+        """The admin has to join the game of the next occurrence again, as the other members"""
+        Event.move_to_next_occurrence(self)
+        self._admin_joined = False
+
     """
 
     @property
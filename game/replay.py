@@ -0,0 +1,122 @@
+"""Plays again the games recorded by a ReplayLog, without discord"""
+
+import glob
+import os
+import time
+
+from .session import Session
+from .replay_log import ReplayLog
+
+
+# The messages (index of the author, content) of the game played by check_round_trip : player 3 quits in the middle of
+# the game, and the admin kicks player 4 later on
+ROUND_TRIP_SCRIPT = (
+    (0, "$skip"),
+    (1, "bonjour"),
+    (3, "$quit"),
+    (0, "$skip"),
+    (2, "au revoir"),
+    (0, "$kick Joueur4"),
+    (0, "$skip"),
+    (0, "$skip"),
+)
+
+
+class StubUser(object):
+    """Stands for a discord.User during a replay. It only counts the messages it is sent."""
+    def __init__(self, _id, name):
+        self.id = _id
+        self.name = name
+        self.display_name = name
+        self.sent = 0
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def mention(self):
+        return "<@%i>" % self.id
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+
+class StubMessage(object):
+    def __init__(self, content, author):
+        self.content = content
+        self.author = author
+
+    async def delete(self):
+        pass
+
+
+class _ReplayedSession(Session):
+    """A Session that doesn't wait between two steps, and that remembers which steps it went through"""
+    def __init__(self, *args, **kwargs):
+        Session.__init__(self, *args, **kwargs)
+        self.transitions = []
+
+    def get_transition_delay(self, step):
+        return 0
+
+    def on_step_started(self, step):
+        self.transitions.append(step.__class__.__name__)
+
+
+async def replay(file, dialogs):
+    """
+    Plays again the game recorded into the replay log FILE, as fast as possible and with stub users, using the StoryBook
+    DIALOGS. Returns a dict with the session, the number of messages replayed, the time it took, and whether the game
+    went through the same steps than the recorded one.
+    """
+    records = ReplayLog.read(file)
+    _, name, seed, admin_id, players = next(records)
+    users = {_id: StubUser(_id, player_name) for _id, player_name in players}
+
+    session = _ReplayedSession(name, users[admin_id], None, dialogs)
+    session.force_build(list(users.values()))
+
+    recorded_transitions = []
+    replayed = 0
+    start = time.perf_counter()
+    await session.launch(seed=seed)
+
+    for record in records:
+        kind = record[0]
+        if kind == "msg":
+            await session.react(StubMessage(record[3], users[record[2]]))
+            replayed += 1
+        elif kind == "join":
+            users[record[2]] = StubUser(record[2], record[3])
+            await session.add_player(users[record[2]])
+        elif kind == "quit":
+            session.remove_player(record[2])
+        elif kind == "step":
+            recorded_transitions.append(record[2])
+
+    return {
+        "session": session,
+        "messages": replayed,
+        "duration": time.perf_counter() - start,
+        "deterministic": session.transitions == recorded_transitions
+    }
+
+
+async def check_round_trip(dialogs, directory, players_count=5, script=ROUND_TRIP_SCRIPT, seed=0):
+    """
+    Plays a game of PLAYERS_COUNT stub players, launched with SEED, where the players send the messages of SCRIPT, and
+    records it into DIRECTORY. Then replays it, and returns True if the replayed game went through the same steps and ended with the
+    same players than the recorded one.
+    """
+    users = [StubUser(i, "Joueur%i" % i) for i in range(players_count)]
+    session = Session("round-trip", users[0], None, dialogs, step_delay=0, replays_dir=directory)
+    session.force_build(users)
+    await session.launch(seed=seed)
+    for author, content in script:
+        await session.react(StubMessage(content, users[author]))
+    players = sorted(session.players)
+    session.close()
+
+    file = max(glob.glob(os.path.join(directory, "round-trip-*.log")), key=os.path.getmtime)
+    result = await replay(file, dialogs)
+    return result["deterministic"] and sorted(result["session"].players) == players
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+
+
+class ReplayLog(object):
+    """
+    Records everything needed to play a game again : the seed of its random generator, its players, and then each
+    message it received, each player that joined or quit it and each step transition, with the number of seconds
+    elapsed since the game was launched. Each record is a json array written on its own line :
+        ["game", NAME, SEED, ADMIN_ID, [[PLAYER_ID, PLAYER_NAME], ...]]
+        ["msg", TIME, AUTHOR_ID, CONTENT]
+        ["join", TIME, PLAYER_ID, PLAYER_NAME]
+        ["quit", TIME, PLAYER_ID]
+        ["step", TIME, STEP_CLASS_NAME]
+    """
+    def __init__(self, file: str):
+        self.file = file
+        self._stream = open(file, 'w', encoding="utf-8")
+        self._start = time.time()
+
+    @classmethod
+    def create(cls, directory, game_name):
+        """Returns a new ReplayLog in DIRECTORY, named after GAME_NAME and the current time"""
+        os.makedirs(directory, exist_ok=True)
+        return cls(os.path.join(directory, "%s-%i.log" % (game_name.strip('.'), time.time())))
+
+    def _write(self, *record):
+        self._stream.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._stream.flush()
+
+    def _time(self):
+        return round(time.time() - self._start, 3)
+
+    def game(self, name, seed, admin, players):
+        self._write("game", name, seed, admin.id, [[player.id, player.name] for player in players])
+
+    def message(self, msg):
+        self._write("msg", self._time(), msg.author.id, msg.content)
+
+    def join(self, player):
+        self._write("join", self._time(), player.id, player.name)
+
+    def quit(self, player_id):
+        self._write("quit", self._time(), player_id)
+
+    def step(self, step):
+        self._write("step", self._time(), step.__class__.__name__)
+
+    def close(self):
+        self._stream.close()
+
+    @staticmethod
+    def read(file):
+        """Yields the records of the replay log FILE"""
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
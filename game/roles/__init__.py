@@ -1,5 +1,6 @@
 from .roles import Roles
 from .rolegroup import RoleGroup
+from .win_conditions import WinConditions, Outcome
 
 from .villager import Villager
 from .hunter import Hunter
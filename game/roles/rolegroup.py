@@ -1,49 +1,148 @@
 import random
 
+from assets.utils import broadcast
 
-class RoleGroup(set):
-    def __init__(self, roles):
-        set.__init__(self, roles)
 
-    def __eq__(self, other):
-        if not isinstance(other, (set, RoleGroup)):
-            try:
-                other = set(other)
-            except Exception as e:
-                raise TypeError("Invalid type %s for RoleGroup.__eq__(self, other)" % other.__class__.__name__) from e
+class PlayerSlots:
+    """
+    Gives each player of a game a slot, i.e. a bit position, so that any group of players of this game can be stored
+    as a single integer used as a bitset (see RoleGroup). A slot is never given back, even if its player quits.
+    """
+    def __init__(self, roles=()):
+        self.roles = []
+        self.ids = {}
+        self.alive = None  # The live RoleGroup of the alive players, if a Roles keeps one up to date
+        for role in roles:
+            self.add(role)
 
-        return set.__eq__(self, other)
+    def add(self, role):
+        """Gives a new slot to ROLE, and returns the corresponding bit"""
+        self.ids[role.user.id] = len(self.roles)
+        self.roles.append(role)
+        return 1 << (len(self.roles) - 1)
 
-    def contains_player(self, player_id):
+    def bit(self, user_id):
+        """Returns the bit of the player that has the id USER_ID, or 0 if he has no slot"""
+        slot = self.ids.get(user_id)
+        return 0 if slot is None else 1 << slot
+
+    def mask(self, roles):
+        """Returns the bitset containing all the ROLES. Raises a KeyError if one of them has no slot."""
+        mask = 0
+        for role in roles:
+            mask |= 1 << self.ids[role.user.id]
+        return mask
+
+
+class RoleGroup:
+    """
+    A group of players of a game, stored as a bitset over the PlayerSlots of this game. Membership tests, comparisons
+    and set operations (&, |, -) between groups of the same game cost a few integer operations, and exclude() or
+    only_alive() return new groups instead of copying or modifying this one.
+    RoleGroups can't be modified, except for the live views of Roles (everyone, alive_players...), that Roles keeps up
+    to date. Use copy() to get a snapshot of one of them.
+    """
+
+    __slots__ = ('_slots', '_mask')
+
+    def __init__(self, slots, mask=0):
+        self._slots = slots
+        self._mask = mask
+
+    @classmethod
+    def of(cls, slots, roles):
+        """Returns the RoleGroup containing the iterable ROLES"""
+        return cls(slots, slots.mask(roles))
+
+    def __repr__(self):
+        return "<RoleGroup : %s>" % ", ".join(repr(role) for role in self)
+
+    def __iter__(self):
+        mask = self._mask
+        roles = self._slots.roles
+        while mask:
+            lowest = mask & -mask
+            yield roles[lowest.bit_length() - 1]
+            mask ^= lowest
+
+    def __len__(self):
+        return bin(self._mask).count("1")
+
+    def __bool__(self):
+        return self._mask != 0
+
+    def __contains__(self, role):
+        user = getattr(role, 'user', None)
+        return user is not None and bool(self._mask & self._slots.bit(user.id))
+
+    def _mask_of(self, other):
+        """Returns the bitset of OTHER, a RoleGroup of the same game or an iterable of roles"""
+        if isinstance(other, RoleGroup) and other._slots is self._slots:
+            return other._mask
+
+        try:
+            return self._slots.mask(other)
+        except TypeError as e:
+            raise TypeError("Invalid type %s for a RoleGroup operation" % other.__class__.__name__) from e
+
+    def __eq__(self, other):
         try:
-            self.get_player(player_id)
-            return True
-        except KeyError:
+            return self._mask == self._mask_of(other)
+        except (KeyError, AttributeError):  # A player that doesn't belong to this game, or something else than a role
             return False
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __and__(self, other):
+        return RoleGroup(self._slots, self._mask & self._mask_of(other))
+
+    def __or__(self, other):
+        return RoleGroup(self._slots, self._mask | self._mask_of(other))
+
+    def __sub__(self, other):
+        return RoleGroup(self._slots, self._mask & ~self._mask_of(other))
+
+    def _update(self, bit, present):
+        """Adds BIT to the bitset if PRESENT, else removes it. Only used by Roles to keep its live views up to date."""
+        if present:
+            self._mask |= bit
+        else:
+            self._mask &= ~bit
+
+    def copy(self):
+        return RoleGroup(self._slots, self._mask)
+
+    def contains_player(self, player_id):
+        return bool(self._mask & self._slots.bit(player_id))
+
     def get_player(self, player_id):
-        for role in self.copy():
-            if role.user.id == player_id:
-                return role
-        raise KeyError("Cannot find a player with id %i" % player_id)
+        if not self.contains_player(player_id):
+            raise KeyError("Cannot find a player with id %i" % player_id)
+        return self._slots.roles[self._slots.ids[player_id]]
 
     def exclude(self, *player_ids):
+        """Returns a new RoleGroup, containing the players of self but the ones with the given ids"""
+        mask = self._mask
         for _id in player_ids:
-            self.remove(self.get_player(_id))
-        return self
+            mask &= ~self._slots.bit(_id)
+        return RoleGroup(self._slots, mask)
 
     def players(self):
         return [role.user for role in self]
 
     def only_alive(self):
-        for player in self.copy():
-            if not player.alive:
-                self.exclude(player.id)
-        return self
+        """Returns a new RoleGroup, containing the players of self that are alive"""
+        if self._slots.alive is not None:
+            return RoleGroup(self._slots, self._mask & self._slots.alive._mask)
+        return RoleGroup.of(self._slots, (role for role in self if role.alive))
 
-    def random(self):
-        return random.choice(list(self))
+    def random(self, rng=random):
+        """Returns a random player of self, chosen by the random generator RNG"""
+        return rng.choice(list(self))
 
     async def send(self, content=None, **kwargs):
-        for role in self:
-            await role.user.send(content=content, **kwargs)
+        """Sends the message to all the players of self at once, and returns the assets.utils.DeliveryReport"""
+        return await broadcast(self.players(), content, **kwargs)
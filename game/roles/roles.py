@@ -1,6 +1,6 @@
 # -*- coding=utf-8 -*-
 
-from random import shuffle
+import random
 
 from .were_wolf import WereWolf
 from .witch import Witch
@@ -12,18 +12,29 @@ from .little_girl import LittleGirl
 from .guard import Guard
 from .idiot import Idiot
 
-from .rolegroup import RoleGroup
+from .rolegroup import RoleGroup, PlayerSlots
+from .win_conditions import WinConditions
 from assets.exceptions import CommandPermissionError, ProtectedPlayer
 import assets.messages as msgs
 
 
 class Roles(dict):
-    def __init__(self, dialogs, game_name, players: list = None, admin=None):
+    def __init__(self, dialogs, game_name, players: list = None, admin=None, rng=None):
         dict.__init__(self)
         self.clear()  # Else this could store old players in case we restart a game
 
         self.game_name = game_name
         self.dialogs = dialogs
+        self.rng = rng or random.Random()  # The random generator of the game
+        self._slots = PlayerSlots()
+
+        # Indexes, kept up to date by every method that adds, renames or removes a player
+        self._names_by_id = {}
+        self._roles_by_id = {}
+        self._roles_by_type = {}  # Only meaningful for the roles given to a single player (Witch, Hunter...)
+
+        # Live views, updated every time a player is added, wounded, healed, killed or removed
+        self._reset_views()
 
         self.admin = admin
         if players:
@@ -32,22 +43,68 @@ class Roles(dict):
     def __repr__(self):
         return "<Roles : %s>" % ", ".join(name + ' -> ' + user.role.title() for name, user in self.items())
 
+    def set_dialogs(self, dialogs):
+        """Makes self and all the players use the StoryBook DIALOGS from now on"""
+        self.dialogs = dialogs
+        for role in self.values():
+            role.dialogs = dialogs
+
     def build(self, players: list, admin, nicknames=None):
-        shuffle(players)
+        self.rng.shuffle(players)
         self.admin = admin
+        self.clear()
+        self._slots = PlayerSlots()
+        self._names_by_id.clear()
+        self._roles_by_id.clear()
+        self._roles_by_type.clear()
+        self._reset_views()
         self._set_roles(players, nicknames=nicknames)
 
+    def _reset_views(self):
+        self._everyone = RoleGroup(self._slots)
+        self._alive_players = RoleGroup(self._slots)
+        self._dead_players = RoleGroup(self._slots)
+        self._injured_players = RoleGroup(self._slots)
+        self._villagers = RoleGroup(self._slots)
+        self._were_wolfs = RoleGroup(self._slots)
+        self._slots.alive = self._alive_players
+        self._win_conditions = WinConditions()
+
+    def _update_views(self, role):
+        """Updates the live views after ROLE was added, removed, or changed its state"""
+        bit = self._slots.bit(role.user.id)
+        present = role.user.id in self._roles_by_id
+        was_alive = role in self._alive_players
+
+        self._everyone._update(bit, present)
+        self._alive_players._update(bit, present and role.alive)
+        if was_alive != (present and role.alive):
+            self._win_conditions.count(role, 1 if role.alive and present else -1)
+
+        self._dead_players._update(bit, present and not role.alive)
+        self._injured_players._update(bit, present and role.injured and role.alive)
+        self._villagers._update(bit, present and not isinstance(role, WereWolf))
+        self._were_wolfs._update(bit, present and isinstance(role, WereWolf))
+
     def _set_roles(self, players: list, nicknames=None):
         max_were_wolfs = (len(players) // 5) + 1
         nicknames = nicknames or {}
 
         def set_role(_player, role):
+            role = role(_player, self.dialogs)
             if nicknames.get(_player.id):
-                self[nicknames[_player.id]] = role(_player, self.dialogs)
+                name = nicknames[_player.id]
             elif self.get(_player.name):
-                self[_player.__str__()] = role(_player, self.dialogs)  # discord.User.__str__ returns name#discriminator
+                name = _player.__str__()  # discord.User.__str__ returns name#discriminator
             else:
-                self[_player.name] = role(_player, self.dialogs)
+                name = _player.name
+
+            self[name] = role
+            self._slots.add(role)
+            self._names_by_id[_player.id] = name
+            self._roles_by_id[_player.id] = role
+            self._roles_by_type[type(role)] = role
+            self._update_views(role)
 
         roles_order = [
             *([WereWolf]*max_were_wolfs),
@@ -111,127 +168,133 @@ class Roles(dict):
         return self.get(name)
 
     def get_role_by_id(self, user_id: int):
-        for role in self.values():
-            if role.user.id == user_id:
-                return role
+        return self._roles_by_id.get(user_id)
 
     def get_name_by_id(self, user_id: int):
-        for name, role in self.items():
-            if role.user.id == user_id:
-                return name
+        return self._names_by_id.get(user_id)
 
     def get_name_by_role(self, user_role):
-        for name, role in self.items():
-            if role == user_role:
-                return name
+        if user_role is not None:
+            return self._names_by_id.get(user_role.user.id)
 
     def change_nickname(self, old: str, new: str):
         self[new] = self.pop(old)
+        self._names_by_id[self[new].user.id] = new
 
     @property
     def everyone(self):
         """Returns a RoleGroup object containing all players of this game."""
-        return RoleGroup(self.values())
+        return self._everyone
 
     @property
     def alive_players(self):
         """Returns a RoleGroup object containing all alive and not injured players of this game."""
-        return RoleGroup(p for p in self.values() if p.alive)
+        return self._alive_players
 
     @property
     def dead_players(self):
         """Returns a RoleGroup object containing all dead players of this game."""
-        return RoleGroup(p for p in self.values() if not p.alive)
+        return self._dead_players
 
     @property
     def injured_players(self):
         """Returns a RoleGroup object containing all injured but alive players of this game."""
-        return RoleGroup(p for p in self.values() if p.injured and p.alive)
+        return self._injured_players
 
     @property
     def villagers(self):
         """Returns a RoleGroup object containing all non-Werewolfs of this game."""
-        return RoleGroup(w for w in self.players() if not isinstance(w, WereWolf))
+        return self._villagers
 
     @property
     def were_wolfs(self):
         """Returns a RoleGroup object containing all Werewolfs of this game."""
-        return RoleGroup(w for w in self.players() if isinstance(w, WereWolf))
+        return self._were_wolfs
+
+    @property
+    def outcome(self):
+        """Returns the game.roles.Outcome of the game if it is over, None otherwise"""
+        return self._win_conditions.outcome()
 
     @property
     def hunter(self):
         """Returns the Hunter of this game."""
-        for r in self.players():
-            if isinstance(r, Hunter):
-                return r
+        return self._roles_by_type.get(Hunter)
 
     @property
     def love_maker(self):
         """Returns the LoveMaker of this game"""
-        for r in self.players():
-            if isinstance(r, LoveMaker):
-                return r
+        return self._roles_by_type.get(LoveMaker)
 
     @property
     def seeker(self):
         """Returns the Seeker of this game"""
-        for r in self.players():
-            if isinstance(r, Seeker):
-                return r
+        return self._roles_by_type.get(Seeker)
 
     @property
     def witch(self):
         """Returns the Witch of this game"""
-        for r in self.players():
-            if isinstance(r, Witch):
-                return r
+        return self._roles_by_type.get(Witch)
 
     @property
     def little_girl(self):
         """Returns the LittleGirl of this game"""
-        for r in self.players():
-            if isinstance(r, LittleGirl):
-                return r
+        return self._roles_by_type.get(LittleGirl)
 
     @property
     def guard(self):
         """Returns the Guard of this game"""
-        for r in self.players():
-            if isinstance(r, Guard):
-                return r
+        return self._roles_by_type.get(Guard)
 
     @property
     def idiot(self):
-        for r in self.players():
-            if isinstance(r, Idiot):
-                return r
+        return self._roles_by_type.get(Idiot)
 
     def wound(self, name):
         if self[name].protected:
             raise ProtectedPlayer
         self[name].injured = True
+        self._update_views(self[name])
+
+    def make_lovers(self, name1, name2):
+        """The players NAME1 and NAME2 fall in love with each other"""
+        lover1, lover2 = self[name1], self[name2]
+        lover1.loving = lover2
+        lover2.loving = lover1
+        self._win_conditions.set_lovers(
+            lover1,
+            lover2,
+            alive_lovers=sum(lover in self._alive_players for lover in (lover1, lover2))
+        )
 
     def protect(self, name):
         self[name].protected = True
 
     def heal(self, name):
         self[name].injured = False
+        self._update_views(self[name])
 
     async def kill(self, name, from_lover=False):
-        if self[name].alive:
-            await self[name].kill(roles=self, dialogs=self.dialogs, from_lover=from_lover)
+        role = self[name]
+        if role.alive:
+            await role.kill(roles=self, dialogs=self.dialogs, from_lover=from_lover)
+            self._update_views(role)
 
     async def tell_roles(self):
         for role in self.values():
             await role.tell_role()
 
     async def kill_injured_players(self):
-        for player in self.alive_players.copy():
-            if player.injured:
-                await player.kill(roles=self, dialogs=self.dialogs)
+        for player in self.injured_players.copy():
+            await self.kill(self.get_name_by_id(player.id))
 
     def quit_game(self, player_name):
-        self.pop(player_name)
+        role = self.pop(player_name)
+        self._names_by_id.pop(role.user.id)
+        self._roles_by_id.pop(role.user.id)
+        if self._roles_by_type.get(type(role)) is role:
+            self._roles_by_type.pop(type(role))
+        self._update_views(role)
 
     def set_admin(self, player_name):
         role = self.get_role_by_name(player_name)
@@ -24,7 +24,7 @@ class Villager:
         return not self.__eq__(other)
 
     def __hash__(self):
-        return 0
+        return hash(self.user.id)
 
     @property
     def id(self):
@@ -0,0 +1,52 @@
+import enum
+
+from .were_wolf import WereWolf
+
+
+class Outcome(enum.Enum):
+    """Represents who won a game"""
+    LOVERS = 0
+    NOBODY = 1
+    VILLAGERS = 2
+    WEREWOLFS = 3
+
+
+class WinConditions:
+    """
+    Keeps live counts of the alive werewolfs, villagers and lovers of a game, so that knowing whether the game is over
+    doesn't require to look at every player. Roles keeps it up to date every time a player dies or leaves the game.
+    """
+    def __init__(self):
+        self.alive_werewolfs = 0
+        self.alive_villagers = 0
+
+        self.lovers = ()
+        self.alive_lovers = 0
+        self._mixed_lovers = False  # True if one of the lovers is a werewolf and the other one isn't
+
+    def count(self, role, n=1):
+        """Adds N (which can be negative) to the alive players counts, for the player ROLE"""
+        if isinstance(role, WereWolf):
+            self.alive_werewolfs += n
+        else:
+            self.alive_villagers += n
+
+        if role in self.lovers:
+            self.alive_lovers += n
+
+    def set_lovers(self, lover1, lover2, alive_lovers=2):
+        self.lovers = (lover1, lover2)
+        self.alive_lovers = alive_lovers
+        self._mixed_lovers = isinstance(lover1, WereWolf) ^ isinstance(lover2, WereWolf)
+
+    def outcome(self):
+        """Returns the Outcome of the game if it is over, None otherwise"""
+        if self._mixed_lovers and self.alive_lovers == 2 and self.alive_werewolfs + self.alive_villagers == 2:
+            return Outcome.LOVERS
+        elif not (self.alive_werewolfs or self.alive_villagers):
+            return Outcome.NOBODY
+        elif not self.alive_werewolfs:
+            return Outcome.VILLAGERS
+        elif not self.alive_villagers:
+            return Outcome.WEREWOLFS
+        return None
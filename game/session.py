@@ -1,16 +1,35 @@
+import asyncio
 import discord
+import random
+import traceback
 
 import assets.messages as msgs
-from assets.constants import PREFIX
-from assets.utils import make_mention, indented, StateOwner
+import assets.logger as logger
+from assets.constants import PREFIX, STEP_TRANSITION_DELAY, SESSION_INBOX_SIZE
+from assets.utils import make_mention, indented, StateOwner, configure_logger
 from assets.exceptions import GameRelatedError
-from time import sleep
 from game.roles import Roles
 from game.steps import StepList, NicknamesStep
+from game.replay_log import ReplayLog
+
+
+# Logger configuration
+configure_logger(logger)
 
 
 class Session(StateOwner):
-    def __init__(self, name, admin, home_channel, dialogs):
+    def __init__(self, name, admin, home_channel, dialogs, players_index=None, step_delay=STEP_TRANSITION_DELAY,
+                 on_ended=None, replays_dir=None):
+        """
+        Initialize self.
+
+        PLAYERS_INDEX is an optional dict, shared with the other sessions, that maps each player id to the name of the
+        session he belongs to. Self keeps the entries of its own players up to date.
+        STEP_DELAY is the default number of seconds waited between two steps (see BaseStep.transition_delay)
+        ON_ENDED is an optional coroutine function, called with the name of self once a message posted with self.post
+        has ended the game.
+        REPLAYS_DIR is an optional directory, where a ReplayLog of each game played is written.
+        """
         StateOwner.__init__(self)
         self.name = name
 
@@ -22,15 +41,46 @@ class Session(StateOwner):
         self.admin = admin
         self.home_channel = home_channel
 
+        self._players_index = players_index if players_index is not None else {}
+        self._players_index[admin.id] = name
+
+        self.step_delay = step_delay
+        self._transition_lock = asyncio.Lock()
+
+        self._on_ended = on_ended
+        self._inbox = asyncio.Queue(maxsize=SESSION_INBOX_SIZE)
+        self._worker = None
+
+        self.random = random.Random()  # Seeded at launch, so that the game can be replayed
+        self._replays_dir = replays_dir
+        self._replay_log = None
+
     def active_but_reachable(self):
         """Returns True if self is active and if the current step defines a "on_player_join" method"""
         return self.active() and hasattr(self.steps.current_step, "on_player_join")
 
     def force_build(self, players):
+        self.forget_players()
         self.players = {player.id: player for player in players}
-
-    def remove_player(self, player_id: int):
+        for player_id in self.players:
+            self._players_index[player_id] = self.name
+
+    def forget_players(self):
+        """Removes all the players of self from the players index, e.g. when self is deleted"""
+        for player_id in self.players:
+            if self._players_index.get(player_id) == self.name:
+                self._players_index.pop(player_id)
+
+    def remove_player(self, player_id: int, from_message=False):
+        """
+        Removes the player PLAYER_ID from self. Pass FROM_MESSAGE=True if a message sent to self asked for it ($quit,
+        $kick...) : the replay log already holds this message, so that the removal isn't recorded twice.
+        """
+        if self._replay_log and not from_message:
+            self._replay_log.quit(player_id)
         self.players.pop(player_id)
+        if self._players_index.get(player_id) == self.name:
+            self._players_index.pop(player_id)
         if self.active():
             self.roles.quit_game(self.roles.get_name_by_id(player_id))
 
@@ -42,6 +92,11 @@ class Session(StateOwner):
         if self.active():
             self.roles.set_admin(self.roles.get_name_by_id(player_id))
 
+    def set_dialogs(self, dialogs):
+        """Makes self use the StoryBook DIALOGS from now on, even if the game already started"""
+        self.dialogs = dialogs
+        self.roles.set_dialogs(dialogs)
+
     def has_player(self, player_id: str):
         return player_id in self.players.keys()
 
@@ -50,21 +105,35 @@ class Session(StateOwner):
 
     async def add_player(self, new_player: discord.User):
         self.players[new_player.id] = new_player
+        self._players_index[new_player.id] = self.name
+        if self._replay_log:
+            self._replay_log.join(new_player)
         if self.active_but_reachable():
             self.roles.add_player(new_player)
             await self.steps.current_step.on_player_join(new_player, self.roles, self.dialogs)
 
     async def notify(self, message):
-        await self.roles.everyone.send(indented(message))
+        return await self.roles.everyone.send(indented(message))
+
+    async def launch(self, seed=None):
+        """Launches the game. SEED is the seed of its random generator, a random one is chosen if it isn't given."""
+        seed = random.randrange(2**32) if seed is None else seed
+        self.random.seed(seed)
+        self._close_replay_log()
+        if self._replays_dir:
+            self._replay_log = ReplayLog.create(self._replays_dir, self.name)
+            self._replay_log.game(self.name, seed, self.admin, list(self.players.values()))
 
-    async def launch(self):
         self.set_state("ACTIVE")
         self.steps.__init__()
-        self.roles.__init__(self.dialogs, self.name, list(self.players.values()), self.admin)
+        self.roles.__init__(self.dialogs, self.name, list(self.players.values()), self.admin, rng=self.random)
         await self.steps.current_step.start(self.roles, self.dialogs)
         await self.check_step_continues()
 
     async def react(self, msg):
+        if self._replay_log:
+            self._replay_log.message(msg)
+
         if self.active() and self.has_player(msg.author.id):
             if msg.content.startswith(PREFIX):
                 cmd = msg.content.split()[0][len(PREFIX):]
@@ -75,13 +144,76 @@ class Session(StateOwner):
                 await self.steps.current_step.send(msg, self.roles)
             await self.check_step_continues()
 
-    async def check_step_continues(self):
-        if self.ended():
-            return
-
-        while self.steps.current_step.ended and not self.steps.ended:
-            sleep(1)
-            await self.steps.next_step(self.roles, self.dialogs)
+    def get_transition_delay(self, step):
+        """Returns the number of seconds to wait after STEP has ended, before starting the next one"""
+        return self.step_delay if step.transition_delay is None else step.transition_delay
+
+    def post(self, msg):
+        """
+        Puts MSG in the inbox of self. The messages of the inbox are processed one after the other with self.react,
+        by a task that belongs to self, so that the other games don't have to wait for this one.
+        Returns False if the inbox is full, in which case MSG is dropped, True otherwise.
+        """
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._process_inbox())
+
+        try:
+            self._inbox.put_nowait(msg)
+        except asyncio.QueueFull:
+            logger.warn("The inbox of the game %s is full, a message from %s was dropped" % (self.name, msg.author))
+            return False
+        return True
+
+    async def _process_inbox(self):
+        """Reacts to the messages of the inbox in order, until the game ends"""
+        while not self.ended():
+            msg = await self._inbox.get()
+            try:
+                await self.react(msg)
+            except Exception as e:
+                logger.error("Game %s failed to react to '%s' : %s %s : %s" % (
+                    self.name, msg.content, "".join(traceback.format_tb(e.__traceback__)), e.__class__.__name__, e
+                ))
+
+        if self._on_ended:
+            try:
+                await self._on_ended(self.name)
+            except Exception as e:  # Nothing awaits this task, the error would be lost otherwise
+                logger.error("Game %s failed to end : %s %s : %s" % (
+                    self.name, "".join(traceback.format_tb(e.__traceback__)), e.__class__.__name__, e
+                ))
+
+    def close(self):
+        """Stops the task processing the inbox of self. The messages still waiting in it are dropped."""
+        if self._worker and not self._worker.done() and self._worker is not asyncio.current_task():
+            self._worker.cancel()
+        self._worker = None
+        self._close_replay_log()
+
+    def _close_replay_log(self):
+        if self._replay_log:
+            self._replay_log.close()
+            self._replay_log = None
+
+    def on_step_started(self, step):
+        """Called each time the game goes to the next step STEP"""
+        if self._replay_log:
+            self._replay_log.step(step)
 
-        if self.steps.ended:
-            self.set_state("ENDED")
+    async def check_step_continues(self):
+        """
+        Starts the next steps as long as the current one is ended. The delay between two steps is awaited, so that the
+        other sessions (and the bot itself) keep running meanwhile. The transitions of a session never overlap.
+        """
+        async with self._transition_lock:
+            if self.ended():
+                return
+
+            while self.steps.current_step.ended and not self.steps.ended:
+                await asyncio.sleep(self.get_transition_delay(self.steps.current_step))
+                await self.steps.next_step(self.roles, self.dialogs)
+                self.on_step_started(self.steps.current_step)
+
+            if self.steps.ended:
+                self.set_state("ENDED")
+                self._close_replay_log()
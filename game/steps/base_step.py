@@ -1,7 +1,7 @@
 import traceback
 
 
-from assets.utils import italic, bold, indented, suppress_markdown, suppress, unpack, configure_logger
+from assets.utils import italic, bold, indented, suppress_markdown, unpack, configure_logger
 from assets.constants import ALLTIMES_CMDS, PREFIX, IDIOT
 import assets.logger as logger
 import assets.messages as msgs
@@ -11,12 +11,59 @@ import assets.messages as msgs
 configure_logger(logger)
 
 
+class _Command:
+    """A command of a step, as stored in the command table of its class (see BaseStep.commands)"""
+
+    __slots__ = ('name', 'handler', 'alltimes', 'external', 'base', 'doc')
+
+    def __init__(self, name, handler, external, base):
+        """
+        HANDLER is the function that implements the command. It takes the session as last parameter if EXTERNAL.
+        BASE tells if the command is defined by BaseStep itself.
+        """
+        self.name = name
+        self.handler = handler
+        self.alltimes = name in ALLTIMES_CMDS
+        self.external = external
+        self.base = base
+        if handler.__doc__:
+            self.doc = " ".join(line.strip() for line in handler.__doc__.strip().splitlines()).replace('*', PREFIX)
+        else:
+            self.doc = None
+
+
 class BaseStep:
     """
     Represents a step of a were-wolf game. Defines start, react, send and end, and a few commands.
     Override them if what they currently do is not what you want to do.
     """
 
+    # Seconds waited once this step has ended, before the next one starts. None means the session's default delay
+    transition_delay = None
+
+    # Command name -> _Command, built once for each step class out of its *_cmd and external_*_cmd methods
+    commands = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._build_commands()
+
+    @classmethod
+    def _build_commands(cls):
+        """Builds the command table of the class. A cmd_cmd method takes precedence over an external_cmd_cmd one."""
+        commands = {}
+        for attr in sorted(dir(cls)):
+            if not attr.endswith('_cmd'):
+                continue
+
+            external = attr.startswith('external_')
+            name = attr[len('external_') if external else 0:-len('_cmd')]
+            if external and name in commands:
+                continue
+            commands[name] = _Command(name, getattr(cls, attr), external, base=hasattr(BaseStep, attr))
+
+        cls.commands = commands
+
     def __init__(self, active_roles=None, helps=()):
         """
         Initialize self.
@@ -80,7 +127,7 @@ class BaseStep:
             if (
                 self.active_role and
                 roles.get_role_by_id(msg.author.id).role == self.active_role and
-                len(msg.content) > 0 or hasattr(self, msg.content.strip().split()[0]+'_cmd')
+                len(msg.content) > 0 or msg.content.strip().split()[0] in self.commands
             ):
                 await self.error(
                     to=msg.author,
@@ -103,23 +150,25 @@ class BaseStep:
 
     async def react(self, cmd, args, author, roles, dialogs, session, disable_checks=False):
         """Reacts to a command, such as $kill or $vote."""
+        command = self.commands.get(cmd)
+        alltimes = command is not None and command.alltimes
 
         if not disable_checks:
-            if not (author.alive or cmd in ALLTIMES_CMDS):
+            if not (author.alive or alltimes):
                 await self.error(to=author, msg=msgs.DEAD_USER_INVOKES_CMD)
                 return
 
-            if not (self.is_current_role(author) or cmd in ALLTIMES_CMDS):
+            if not (self.is_current_role(author) or alltimes):
                 await author.send(msgs.WRONG_ROLE)
                 return
 
         try:
-            if hasattr(self, cmd + '_cmd'):
-                await getattr(self, cmd + '_cmd')(args, author, roles, dialogs)
-            elif hasattr(self, 'external_' + cmd + '_cmd'):
-                await getattr(self, 'external_' + cmd + '_cmd')(args, author, roles, dialogs, session)
-            else:
+            if command is None:
                 await self.command_not_found(cmd, author)
+            elif command.external:
+                await command.handler(self, args, author, roles, dialogs, session)
+            else:
+                await command.handler(self, args, author, roles, dialogs)
 
         except Exception as e:
             fmt = "'%s %s' command invocation raised a(n) %s :\n\n%s\n%s\n" % (
@@ -147,7 +196,7 @@ class BaseStep:
 
         await self.info(to=roles.everyone, msg=msgs.GAME_DESTROYED % author.user.display_name)
         for player in session.players.copy().values():
-            session.remove_player(player.id)
+            session.remove_player(player.id, from_message=True)
             await BaseStep.end(self, roles, dialogs)
 
     async def skip_cmd(self, args, author, roles, dialogs):
@@ -203,20 +252,15 @@ class BaseStep:
 
     async def commands_cmd(self, args, author, roles, dialogs):
         """ `*commands` : Renvoie la liste des commandes utilisables """
-        docs = ['- - - - - - - - - - - - - - - ']
-        for attr in dir(self):
-            if "cmd" in attr and (suppress(attr, "_cmd", "external_") in ALLTIMES_CMDS or self.is_current_role(author)):
-                doc = getattr(self, attr).__doc__
-                if doc:
-                    if hasattr(BaseStep, attr):  # Basic command
-                        docs.insert(0, doc)
-                    else:
-                        docs.append(doc)
-
-        await author.send(
-            embed=msgs.GET_COMMANDS.build(commands=",\n- ".join(doc.strip().replace('*', PREFIX) for doc in docs))
+        usable = [c for c in self.commands.values() if c.doc and (c.alltimes or self.is_current_role(author))]
+        docs = (
+            [c.doc for c in reversed(usable) if c.base] +  # Basic commands
+            ['- - - - - - - - - - - - - - -'] +
+            [c.doc for c in usable if not c.base]
         )
 
+        await author.send(embed=msgs.GET_COMMANDS.build(commands=",\n- ".join(docs)))
+
     async def external_quit_cmd(self, args, author, roles, dialogs, session):
         """ `*quit` : Quitte définitivement la partie """
 
@@ -238,7 +282,7 @@ class BaseStep:
         )
 
         await roles.kill(roles.get_name_by_id(author.id))
-        session.remove_player(author.user.id)
+        session.remove_player(author.user.id, from_message=True)
         await self.on_player_quit(roles, dialogs)
 
     async def external_kick_cmd(self, args, author, roles, dialogs, session):
@@ -257,7 +301,7 @@ class BaseStep:
         )
 
         await roles.kill(kicked)
-        session.remove_player(roles.get_role_by_name(kicked).id)
+        session.remove_player(roles.get_role_by_name(kicked).id, from_message=True)
         await self.on_player_quit(roles, dialogs)
 
     async def external_admin_cmd(self, args, author, roles, dialogs, session):
@@ -279,13 +323,22 @@ class BaseStep:
 
     async def help_cmd(self, args, author, roles, dialogs):
         """
-        `*help (full)` : Vous indique ce que vous devez faire ; tapez $help full pour un tutoriel complet du jeu
+        `*help (full|uneCommande)` : Vous indique ce que vous devez faire ; `*help full` affiche un tutoriel complet
+        du jeu, et `*help uneCommande` l'aide de cette commande
         """
         if tuple(args) == ('full',):
             await author.send(embed=msgs.GAME_PRINCIPE.build())
             await author.send(embed=msgs.BASE_COMMANDS.build())
             return
 
+        if len(args) == 1:
+            command = self.commands.get(args[0].lstrip(PREFIX))
+            if command and command.doc:
+                await self.info(to=author, msg=command.doc)
+            else:
+                await self.command_not_found(args[0], author)
+            return
+
         if self.is_current_role(author) and author.alive:
             await self.info(to=author, msg=self.active_help)
         else:
@@ -307,3 +360,6 @@ class ReachableStep(BaseStep):
     async def on_player_join(self, player, roles, dialogs):
         await self.info(roles.everyone.exclude(player.id), msgs.SOMEONE_JOINED_THE_ACTIVE_GAME % player.display_name)
         await self.info(player, msgs.ACTIVE_GAME_JOINED)
+
+
+BaseStep._build_commands()
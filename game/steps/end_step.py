@@ -1,10 +1,10 @@
 from .base_step import BaseStep
-from game.roles import Roles
+from game.roles import Roles, Outcome
 from game.session import Session
 from assets.utils import block
 
 import assets.messages as msgs
-from assets.constants import MINIMUM_PLAYERS, WEREWOLF
+from assets.constants import MINIMUM_PLAYERS
 
 
 class EndStep(BaseStep):
@@ -23,25 +23,27 @@ class EndStep(BaseStep):
     async def start(self, roles: Roles, dialogs):
         roles_summary = "- "+",\n- ".join([name+': '+role.role for name, role in roles.items()])
 
-        if (len(roles.alive_players) == 2 and list(roles.alive_players)[0].loving == list(roles.alive_players)[1] and
-                (list(roles.alive_players)[0].role == WEREWOLF) ^ (list(roles.alive_players)[1].role == WEREWOLF)):
+        outcome = roles.outcome
+
+        if outcome is Outcome.LOVERS:
+            lover1, lover2 = roles.alive_players
             await roles.everyone.send(dialogs.everyone.lovers_won.tell(
-                lover1=roles.get_name_by_id(list(roles.alive_players)[0].id),
-                lover2=roles.get_name_by_id(list(roles.alive_players)[1].id),
+                lover1=roles.get_name_by_id(lover1.id),
+                lover2=roles.get_name_by_id(lover2.id),
                 roles=roles_summary
             ))
             winners = roles.alive_players
 
-        elif not roles.alive_players:
+        elif outcome is Outcome.NOBODY:
             await roles.everyone.send(dialogs.everyone.nobody_won.tell(roles=roles_summary))
             winners = ()
             await self.end(roles, dialogs)
 
-        elif roles.alive_players == roles.villagers.only_alive():
+        elif outcome is Outcome.VILLAGERS:
             await roles.everyone.send(dialogs.everyone.villagers_won.tell(roles=roles_summary))
             winners = roles.villagers
 
-        elif roles.alive_players == roles.were_wolfs.only_alive():
+        elif outcome is Outcome.WEREWOLFS:
             await roles.everyone.send(dialogs.everyone.werewolfs_won.tell(roles=roles_summary))
             winners = roles.were_wolfs
 
@@ -58,8 +60,7 @@ class EndStep(BaseStep):
         await roles.everyone.send(dialogs.everyone.game_ended.tell())
 
     async def external_quit_cmd(self, args, author, roles, dialogs, session):
-        EndStep.external_quit_cmd.__doc__ = BaseStep.external_quit_cmd.__doc__  # Copying base doc
-
+        """ `*quit` : Quitte définitivement la partie """
         self.xp_counts[author.id] = author.xp
         await BaseStep.external_quit_cmd(self, args, author, roles, dialogs, session)
 
@@ -78,7 +79,8 @@ class EndStep(BaseStep):
             return
 
         await roles.everyone.send(block(msgs.GAME_RESTARTED))
-        await session.launch()
+        # The seed comes from the random generator of the game that ended, so that a replay restarts the same game
+        await session.launch(seed=session.random.randrange(2**32))
 
     async def end(self, roles, dialogs):
         await BaseStep.end(self, roles, dialogs)
@@ -19,6 +19,7 @@ class GuardStep(BaseStep):
         self.__init__()
         if not (roles.guard and roles.guard.alive):
             await BaseStep.end(self, roles, dialogs)
+            return
 
         await roles.everyone.send(dialogs.guard.wakes_up.tell())
         await roles.guard.send(dialogs.guard.turn.tell())
@@ -44,8 +44,7 @@ class LoveMakerStep(BaseStep):
         target1 = roles.get_role_by_name(target1_name)
         target2 = roles.get_role_by_name(target2_name)
 
-        target1.loving = target2
-        target2.loving = target1
+        roles.make_lovers(target1_name, target2_name)
         await target1.user.send(dialogs.lovemaker.in_love.tell(lover=target2_name, role=target2.role.upper()))
         await target2.user.send(dialogs.lovemaker.in_love.tell(lover=target1_name, role=target1.role.upper()))
         if (target1.role == WEREWOLF) ^ (target2.role == WEREWOLF):
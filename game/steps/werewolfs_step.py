@@ -28,8 +28,8 @@ class _LittleGirlProbabilities(object):
         self.nothing_happens = self.NOTHING_HAPPENS
         self.werewolf_seen = self.WEREWOLF_SEEN
 
-    def spy(self):
-        result = random.randint(0, 100)
+    def spy(self, rng=random):
+        result = rng.randint(0, 100)
 
         if result in self.caught_red_handed:
             ret = _LittleGirlResults.CAUGHT_RED_HANDED
@@ -184,10 +184,10 @@ class WereWolfsStep(BaseStep):
             await self.error(to=author, msg=str(e))
             return
         
-        result = self.probabilities.spy()
+        result = self.probabilities.spy(roles.rng)
 
         if result == _LittleGirlResults.WEREWOLF_SEEN:
-            self.werewolf_seen = roles.were_wolfs.only_alive().random()
+            self.werewolf_seen = roles.were_wolfs.only_alive().random(roles.rng)
             await author.send(dialogs.little_girl.werewolf_seen.tell(werewolf=self.werewolf_seen.user.name))
         elif result == _LittleGirlResults.NOTHING_HAPPENS:
             await author.send(dialogs.little_girl.nothing_happens.tell())
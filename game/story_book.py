@@ -1,8 +1,14 @@
 import json
+import re
+import string
 from random import choice
 from assets.utils import block
 
 
+_FORMATTER = string.Formatter()
+_REQUIRED_INFO = re.compile(r"Informations nécessaires : (.*)$")
+
+
 class StoryBook(dict):
     """
     Store all the dialogs, based on a json file.
@@ -23,9 +29,10 @@ class StoryBook(dict):
         return str(self.as_json())
 
     def _get_dialogs(self, file):
-        """Internal function to read the json file."""
+        """Internal function to read the json file. Every dialog is compiled, see _Dialog."""
         with open(file, 'r') as json_file:
             all_dialogs = json.loads(json_file.read())
+        self._loaded = all_dialogs
 
         for chapter, chapter_content in all_dialogs.items():
             self[chapter] = _StoryChapter()
@@ -43,6 +50,36 @@ class StoryBook(dict):
 
         return json_dict
 
+    def modified(self):
+        """Returns True if the dialogs were changed since they were read from the json file"""
+        return self.as_json() != self._loaded
+
+    def validate(self, schema_file):
+        """
+        Checks self against the json SCHEMA_FILE (see data/editable.json), that describes the chapters and the pages the
+        book should have, and optionally the informations each page can use. Returns the list of the problems found.
+        """
+        with open(schema_file, 'r') as json_file:
+            schema = json.loads(json_file.read())
+
+        problems = []
+        for chapter, pages in schema.items():
+            for page, description in pages.items():
+                if page not in self.get(chapter, {}):
+                    problems.append("The page %s.%s is missing" % (chapter, page))
+                    continue
+
+                required = _REQUIRED_INFO.search(description) if isinstance(description, str) else None
+                if required:
+                    allowed = {info.strip() for info in required.group(1).split(",") if info.strip() not in ("", "-")}
+                    unknown = self[chapter][page].placeholders - allowed
+                    if unknown:
+                        problems.append("The page %s.%s uses unknown informations : %s" % (
+                            chapter, page, ", ".join(sorted(unknown))
+                        ))
+
+        return problems
+
     def save(self, file):
         """
         Saves the storybook into FILE. Then, if you want to put this data into an other StoryBook, you can just do :
@@ -72,9 +109,53 @@ class _StoryChapter(dict):
             return object.__getattribute__(self, item)
 
 
+class _Dialog(object):
+    """
+    A dialog of a _StoryPage, compiled once : its PLACEHOLDERS are known, and it's turned into a %-style template
+    already formatted as a discord block. A dialog that has no placeholder is rendered once for all.
+    Raises a SyntaxError if the dialog isn't a valid format string.
+    """
+
+    __slots__ = ('text', 'placeholders', '_template', '_rendered')
+
+    def __init__(self, text):
+        self.text = text
+        try:
+            fields = list(_FORMATTER.parse(text))
+        except ValueError as e:
+            raise SyntaxError("Invalid dialog %r : %s" % (text, e))
+
+        names = [name for _, name, _, _ in fields if name is not None]
+        self.placeholders = frozenset(re.match(r"[^.\[]*", name).group() for name in names)
+
+        plain = all(name.isidentifier() for name in names) and not any(spec or conv for _, _, spec, conv in fields)
+        if not plain:
+            self._template = None  # Not only plain {name} placeholders, we let str.format handle it
+        else:
+            self._template = block("".join(
+                literal.replace("%", "%%") + ("%%(%s)s" % name if name is not None else "")
+                for literal, name, _, _ in fields
+            ))
+
+        self._rendered = block(text.format()) if not self.placeholders else None
+
+    def render(self, info):
+        if self._rendered is not None:
+            return self._rendered
+        elif self._template is not None:
+            return self._template % info
+        return block(self.text.format(**info))
+
+
 class _StoryPage(list):
     def __init__(self, dialogs):
         list.__init__(self, dialogs)
+        self._dialogs = [_Dialog(dialog) for dialog in self]
+
+    @property
+    def placeholders(self):
+        """The informations the dialogs of self use"""
+        return frozenset().union(*(dialog.placeholders for dialog in self._dialogs))
 
     def to_list(self):
         """Returns list(self)"""
@@ -86,9 +167,8 @@ class _StoryPage(list):
         dialog is "Hello {player} !", tell(player="Someone") returns "Hello Someone !".
         Then formats the dialog as a discord block and returns it.
         """
-        dialog = choice(self)
-        dialog = dialog.format(**info)
-        return block(dialog)
+        return choice(self._dialogs).render(info)
 
     def write(self, *dialogs):
         self.extend(dialogs)
+        self._dialogs.extend(_Dialog(dialog) for dialog in dialogs)
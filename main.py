@@ -3,7 +3,7 @@ import discord
 import discord.ext.tasks as tasks
 import traceback
 
-from bot import GameMaster
+from bot import GameMaster, open_storage
 from assets.utils import assure_assertions, configure_logger
 import assets.logger as logger
 import assets.token as token
@@ -36,8 +36,11 @@ commands.level_cmd.__implement__(bot)
 @bot.event
 async def on_ready():
     logger.info("Ready as %s with id %s" % (bot.user.name, bot.user.id))
+    if bot.storage is not None:
+        return  # on_ready is called again after each reconnection, while the data is already loaded
+
     try:
-        bot.load(consts.EVENTS_PATH, consts.XP_COUNTS_PATH)
+        bot.load(open_storage(consts.STORAGE_BACKEND))
         logger.info("Loaded %i event(s) and %s user(s) xp account(s)" % (len(bot.events), len(bot.xp_counts)))
     except (SyntaxError, FileNotFoundError):
         logger.warn("Data loading failed")
@@ -93,8 +96,7 @@ async def bot_updating():
         return
 
     try:
-        # await bot.activate_events()
-        top_xps = sorted({xp for _id, xp in bot.xp_counts.items() if bot.get_level_info(_id)['level'] >= 3})[-5:]
+        top_xps = {xp for _id, xp in bot.xp_counts.ranking(0, 5) if bot.get_level_info(_id)['level'] >= 3}
         guild = bot.get_guild(consts.GUILD)
         roles = guild.roles
         role = discord.utils.get(roles, name=consts.TOP_PLAYER_ROLE)
@@ -110,17 +112,28 @@ async def bot_updating():
         bot_updating.close()
 
 
+@tasks.loop(seconds=consts.DIALOGS_WATCH_INTERVAL)
+async def dialogs_watching():
+    if bot.is_ready():
+        await bot.check_dialogs_changed()
+
+
 if __name__ == '__main__':
     try:
         logger.info("Process started")
 
         # Launch the bot
         bot_updating.start()
+        dialogs_watching.start()
         bot.run(token.TOKEN)
     except BaseException as e:
         logger.critical("Killed by %s : %s" % (e.__class__.__name__, e))
     finally:
-        bot.dialogs.save(consts.DIALOGS_PATH)
-        bot.dump(consts.EVENTS_PATH, consts.XP_COUNTS_PATH)
+        if bot.dialogs.modified():
+            bot.dialogs.save(consts.DIALOGS_PATH)
+        bot.dump()
 
+        logger.info("Messages rendered : %s" % ", ".join(
+            "%s (%i)" % item for item in msgs.render_counts().items() if item[1]
+        ))
         logger.info("Process ended")
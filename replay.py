@@ -0,0 +1,43 @@
+"""
+Plays again the games recorded into replay logs (see game/replay_log.py), as fast as possible and without discord, e.g.
+to profile a slow game or to benchmark the steps engine. Usage :
+    python replay.py <replay log> [<replay log> ...]
+    python replay.py --check      Records a scripted game (with players quitting) and checks that it replays the same
+"""
+
+import asyncio
+import sys
+import tempfile
+
+from game import StoryBook
+from game.replay import replay, check_round_trip
+import assets.constants as consts
+
+
+async def main(files):
+    dialogs = StoryBook(consts.DIALOGS_PATH)
+    for file in files:
+        result = await replay(file, dialogs)
+        print("%s : %i message(s) replayed in %.3fs, %s" % (
+            file,
+            result["messages"],
+            result["duration"],
+            "same steps" if result["deterministic"] else "DIFFERENT STEPS than the recorded game"
+        ))
+
+
+async def check():
+    with tempfile.TemporaryDirectory() as directory:
+        ok = await check_round_trip(StoryBook(consts.DIALOGS_PATH), directory)
+    print("Round trip : %s" % ("ok" if ok else "the replayed game DIFFERS from the recorded one"))
+    return ok
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    if sys.argv[1] == "--check":
+        sys.exit(0 if asyncio.get_event_loop().run_until_complete(check()) else 1)
+    asyncio.get_event_loop().run_until_complete(main(sys.argv[1:]))